@@ -0,0 +1,139 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Answer cache looked up by cosine similarity of query embeddings.
+
+    Each entry remembers the chunk IDs its answer was generated from. An entry is dropped once
+    it is older than ttl_seconds, once it is evicted (least recently used first) or once any of
+    its chunks disappears from the index (chunk IDs are content hashes, so edited chunks count).
+    """
+
+    def __init__(self, threshold=0.92, ttl_seconds=24 * 3600, max_size=1000, is_valid=None):
+        """is_valid(chunk_ids) -> bool lets the owner tie entries to the current index."""
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.is_valid = is_valid
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._keys = []  # Key of each matrix row; rows of dropped entries stay until the next compaction
+        self._matrix = None  # Normalized embeddings, grown by doubling; rows past len(self._keys) are unused
+        self._lock = threading.Lock()
+
+    def _normalize(self, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _compact(self):
+        self._keys = list(self._entries)
+        if self._keys:
+            self._matrix = np.stack([self._entries[key]["vector"] for key in self._keys])
+        else:
+            self._matrix = None
+
+    def _append(self, key, vector):
+        rows = len(self._keys)
+        if self._matrix is None or rows == len(self._matrix):
+            grown = np.empty((max(64, 2 * rows), len(vector)), dtype=np.float32)
+            if rows:
+                grown[:rows] = self._matrix[:rows]
+            self._matrix = grown
+        self._matrix[rows] = vector
+        self._keys.append(key)
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            self._drop(key)
+
+    def lookup(self, embedding, chunk_ids=None):
+        """Return the cached entry for the most similar earlier question, or None.
+
+        When chunk_ids is given, only entries generated from exactly that chunk set match.
+        """
+        vector = self._normalize(embedding)
+        wanted = frozenset(chunk_ids) if chunk_ids is not None else None
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if len(self._keys) > 2 * len(self._entries) + 64:
+                self._compact()  # Mostly rows of dropped entries
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            scores = self._matrix[: len(self._keys)] @ vector
+            for index in np.argsort(-scores):
+                if scores[index] < self.threshold:
+                    break
+                key = self._keys[index]
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if wanted is not None and entry["chunk_ids"] != wanted:
+                    continue
+                if self.is_valid and not self.is_valid(entry["chunk_ids"]):
+                    self._drop(key)
+                    continue
+                self._entries.move_to_end(key)
+                entry["hits"] += 1
+                self.hits += 1
+                return {
+                    "query": entry["query"],
+                    "answer": entry["answer"],
+                    "context": entry["context"],
+                    "chunk_ids": list(entry["chunk_ids"]),
+                    "similarity": float(scores[index]),
+                }
+
+            self.misses += 1
+            return None
+
+    def store(self, query, embedding, chunk_ids, answer, context=""):
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._entries[self._next_key] = {
+                "query": query,
+                "vector": vector,
+                "chunk_ids": frozenset(chunk_ids),
+                "answer": answer,
+                "context": context,
+                "created": time.time(),
+                "hits": 0,
+            }
+            self._append(self._next_key, vector)
+            self._next_key += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_chunks(self, chunk_ids):
+        """Drop every entry that was generated from any of chunk_ids."""
+        chunk_ids = set(chunk_ids)
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry["chunk_ids"] & chunk_ids]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys = []
+            self._matrix = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
@@ -0,0 +1,74 @@
+import re
+import math
+import heapq
+from collections import Counter, defaultdict
+
+# Very common English words carry no signal for BM25
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it its of on or
+should that the their them there these they this to was what when where which who why will with
+you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """In-memory inverted index over chunk contents with Okapi BM25 scoring."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        """chunks: iterable of chunk dicts with chunk_id and content."""
+        self.k1 = k1
+        self.b = b
+        self.chunk_ids = []
+        self.postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+        lengths = []
+        for chunk in chunks:
+            doc = len(self.chunk_ids)
+            self.chunk_ids.append(chunk["chunk_id"])
+            tokens = tokenize(chunk.get("content", ""))
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((doc, tf))
+
+        self.doc_count = len(self.chunk_ids)
+        avg_length = sum(lengths) / self.doc_count if self.doc_count else 0.0
+        # Precompute the per-document length normalisation and per-term IDF
+        self._norms = [k1 * (1 - b + b * length / avg_length) if avg_length else k1 for length in lengths]
+        self._idf = {
+            term: math.log(1 + (self.doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self):
+        return self.doc_count
+
+    def search(self, query, k=10, allowed_ids=None):
+        """Return up to k (chunk_id, score) pairs, best first. allowed_ids restricts the candidates."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self.postings[term]:
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + self._norms[doc])
+
+        if allowed_ids is not None:
+            scores = {doc: score for doc, score in scores.items() if self.chunk_ids[doc] in allowed_ids}
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.chunk_ids[doc], score) for doc, score in best]
+
+
+def reciprocal_rank_fusion(rankings, weights=None, k=60, limit=None):
+    """Fuse ranked ID lists: score(id) = sum(weight / (k + rank)). Returns [(id, score)] best first."""
+    weights = weights or [1.0] * len(rankings)
+    fused = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] += weight / (k + rank)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return ordered[:limit] if limit else ordered
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from packed_corpus import CORPUS_NAME, INDEX_NAME, PackedCorpus
+
+PACKED_FILES = (CORPUS_NAME, INDEX_NAME)
+
+
+def content_hash(content):
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(disease, category, sub_category, content):
+    """Deterministic chunk ID: the same section with the same text always gets the same ID."""
+    key = "\x1f".join([disease, category, sub_category, content_hash(content)])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class ChunkStore:
+    """Chunk ID -> chunk index built from the processed_data folder.
+
+    *_documents.json chunks are held in a dict; a packed corpus.jsonl is not loaded but served
+    through its memory-mapped offset index (PackedCorpus).
+    """
+
+    def __init__(self, chunks_folder, check_interval=5.0):
+        """Load every *_documents.json in chunks_folder once and index it by chunk ID; open corpus.jsonl + corpus.idx if present."""
+        self.chunks_folder = chunks_folder
+        self.check_interval = check_interval
+        self.chunks = {}
+        self.packed = None
+        self.version = 0  # Bumped whenever the indexed chunks change
+        self._file_ids = {}
+        self._file_mtimes = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _scan(self):
+        mtimes = {}
+        if not os.path.isdir(self.chunks_folder):
+            return mtimes
+        for file_name in os.listdir(self.chunks_folder):
+            if file_name.endswith("_documents.json") or file_name in PACKED_FILES:
+                file_path = os.path.join(self.chunks_folder, file_name)
+                try:
+                    mtimes[file_name] = os.path.getmtime(file_path)
+                except OSError:
+                    continue
+        return mtimes
+
+    def _load_file(self, file_name):
+        file_path = os.path.join(self.chunks_folder, file_name)
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                chunks = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Failed to load {file_path}: {e}")
+            return []
+        return chunks if isinstance(chunks, list) else []
+
+    def _open_packed(self, mtimes):
+        if not all(name in mtimes for name in PACKED_FILES):
+            return None
+        try:
+            return PackedCorpus(self.chunks_folder)
+        except OSError as e:
+            print(f"Failed to open the packed corpus in {self.chunks_folder}: {e}")
+            return None
+
+    def reload(self):
+        """Re-read only the chunk files that were added, changed or removed since the last load.
+
+        The new index is built on a copy and swapped in together with the packed corpus and the
+        version, so readers (which do not take the lock) see either the old chunks or the new ones,
+        never a mix. A replaced PackedCorpus is left for readers still using it and closes when
+        garbage collected.
+        """
+        with self._lock:
+            mtimes = self._scan()
+            if mtimes != self._file_mtimes:
+                chunks = dict(self.chunks)
+                file_ids = dict(self._file_ids)
+                packed = self.packed
+                if any(self._file_mtimes.get(name) != mtimes.get(name) for name in PACKED_FILES):
+                    packed = self._open_packed(mtimes)
+
+                for file_name in set(self._file_mtimes) - set(mtimes) - set(PACKED_FILES):
+                    for chunk_id in file_ids.pop(file_name, []):
+                        chunks.pop(chunk_id, None)
+
+                for file_name, mtime in mtimes.items():
+                    if file_name in PACKED_FILES or self._file_mtimes.get(file_name) == mtime:
+                        continue
+                    for chunk_id in file_ids.pop(file_name, []):
+                        chunks.pop(chunk_id, None)
+                    ids = []
+                    for chunk in self._load_file(file_name):
+                        chunk_id = chunk.get("chunk_id")
+                        if chunk_id:
+                            chunks[chunk_id] = chunk
+                            ids.append(chunk_id)
+                    file_ids[file_name] = ids
+
+                self.chunks, self.packed, self.version = chunks, packed, self.version + 1
+                self._file_ids = file_ids
+                self._file_mtimes = mtimes
+            self._last_check = time.monotonic()
+
+    def refresh(self):
+        """Reload if the source folder may have changed (checked at most every check_interval seconds)."""
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self.reload()
+
+    def __len__(self):
+        packed = self.packed
+        return len(self.chunks) + (len(packed) if packed is not None else 0)
+
+    def __contains__(self, chunk_id):
+        packed = self.packed
+        return chunk_id in self.chunks or (packed is not None and chunk_id in packed)
+
+    def contains_all(self, chunk_ids):
+        """True if every chunk ID is still indexed (edited chunks get new IDs, so this also catches edits)."""
+        self.refresh()
+        return all(chunk_id in self for chunk_id in chunk_ids)
+
+    def get(self, chunk_id):
+        """Return the full chunk dict (chunk_id, metadata, content) or None."""
+        self.refresh()
+        chunk, packed = self.chunks.get(chunk_id), self.packed
+        if chunk is None and packed is not None:
+            chunk = packed.get(chunk_id)
+        return chunk
+
+    def all_chunks(self):
+        """Every chunk: the *_documents.json ones, then the packed corpus in ingestion order."""
+        chunks, packed = list(self.chunks.values()), self.packed
+        if packed is not None:
+            chunks.extend(packed)
+        return chunks
+
+    def get_content(self, chunk_id):
+        chunk = self.get(chunk_id)
+        return chunk["content"] if chunk else None
+
+    def get_metadata(self, chunk_id):
+        chunk = self.get(chunk_id)
+        return chunk.get("metadata", {}) if chunk else None
@@ -1,45 +1,160 @@
 import json
 import os
-import uuid  # To generate unique chunk IDs
+import zipfile
+import argparse
+from chunk_store import make_chunk_id  # Deterministic chunk IDs
+from context_builder import count_tokens, SENTENCE_END
+from packed_corpus import write_corpus, CORPUS_NAME, INDEX_NAME
 
-# Folder containing JSON files
+# Folder (or zip) containing JSON files
 input_folder = "/home/shtlp_0042/Desktop/RAG/scraped_data"
 output_folder = "/home/shtlp_0042/Desktop/RAG/processed_data"
 
-# Ensure output folder exists
-os.makedirs(output_folder, exist_ok=True)
+# Sections longer than this are split in the packed format (MiniLM truncates its input at 256
+# word pieces). The files format keeps sections whole unless --max-tokens is given, since splitting
+# changes the chunk IDs of every split section and forces a full re-index.
+max_chunk_tokens = 200
+chunk_overlap_tokens = 40
 
-# Get all JSON files in the scraped folder
-json_files = [f for f in os.listdir(input_folder) if f.endswith(".json")]
 
-for file_name in json_files:
-    file_path = os.path.join(input_folder, file_name)
-    
-    # Extract disease name from the file name (removing .json)
-    disease_name = os.path.splitext(file_name)[0]
+def iter_scraped(source):
+    """Yield (disease name, scraped dict) from a folder of JSON files or straight from a zip, one at a time."""
+    if os.path.isdir(source):
+        for file_name in sorted(f for f in os.listdir(source) if f.endswith(".json")):
+            with open(os.path.join(source, file_name), "r", encoding="utf-8") as file:
+                yield os.path.splitext(file_name)[0], json.load(file)
+        return
+    with zipfile.ZipFile(source) as archive:
+        for name in sorted(n for n in archive.namelist() if n.endswith(".json")):
+            yield os.path.splitext(os.path.basename(name))[0], json.loads(archive.read(name).decode("utf-8"))
 
-    # Load JSON file
-    with open(file_path, "r", encoding="utf-8") as file:
-        data = json.load(file)
 
-    # Process data into chunks
+def split_text(text, max_tokens=max_chunk_tokens, overlap=chunk_overlap_tokens):
+    """Split text into pieces of at most max_tokens at sentence boundaries, repeating up to `overlap`
+    tokens of trailing sentences at the start of the next piece. Over-long sentences are cut by words."""
+    if not max_tokens or count_tokens(text) <= max_tokens:
+        return [text]
+
+    # Over-long sentences are cut into overlap-sized word runs so the overlap still applies to them
+    word_run = min(max_tokens, overlap) if overlap else max_tokens
+    units = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        if count_tokens(sentence) <= max_tokens:
+            units.append(sentence)
+            continue
+        words, current = sentence.split(), []
+        for word in words:
+            if current and count_tokens(" ".join(current + [word])) > word_run:
+                units.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            units.append(" ".join(current))
+
+    pieces, current, used = [], [], 0
+    for unit in units:
+        tokens = count_tokens(unit)
+        if current and used + tokens > max_tokens:
+            pieces.append(" ".join(current))
+            # Carry trailing units (at most `overlap` tokens, never the whole piece) into the next one
+            carried, carried_tokens = [], 0
+            for previous in reversed(current[1:]):
+                previous_tokens = count_tokens(previous)
+                if carried_tokens + previous_tokens > overlap or carried_tokens + previous_tokens + tokens > max_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_tokens
+            current, used = carried, carried_tokens
+        current.append(unit)
+        used += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def build_chunks(disease_name, data, max_tokens=None, overlap=0):
+    """Turn one scraped disease dict into chunk dicts (oversized sections split when max_tokens is set)."""
     documents = []
     for category, sub_dict in data.items():
         for key, value in sub_dict.items():
-            chunk = {
-                "chunk_id": str(uuid.uuid4()),  # Unique ID for each chunk
-                "metadata": {
+            pieces = split_text(value, max_tokens, overlap) if max_tokens else [value]
+            for part, piece in enumerate(pieces):
+                metadata = {
                     "category": category,
                     "sub_category": key,
                     "disease": disease_name
-                },
-                "content": value
-            }
-            documents.append(chunk)
+                }
+                if len(pieces) > 1:
+                    metadata.update(part=part, parts=len(pieces))
+                chunk = {
+                    "chunk_id": make_chunk_id(disease_name, category, key, piece),  # Stable across runs
+                    "metadata": metadata,
+                    "content": piece
+                }
+                documents.append(chunk)
+    return documents
+
+
+def write_files(source, folder, max_tokens, overlap):
+    """One pretty-printed <disease>_documents.json per disease (left untouched if nothing changed)."""
+    expected = set()
+    for disease_name, data in iter_scraped(source):
+        documents = build_chunks(disease_name, data, max_tokens, overlap)
+
+        output_file = os.path.join(folder, f"{disease_name}_documents.json")
+        expected.add(os.path.basename(output_file))
+        serialized = json.dumps(documents, indent=4, ensure_ascii=False)
+        if os.path.exists(output_file):
+            with open(output_file, "r", encoding="utf-8") as existing:
+                if existing.read() == serialized:
+                    print(f"Unchanged: {output_file}")
+                    continue
+        with open(output_file, "w", encoding="utf-8") as out_file:
+            out_file.write(serialized)
+
+        print(f"Processed and saved: {output_file}")
+
+    # Drop processed files for diseases that are no longer scraped (and a packed corpus from another run)
+    for file_name in os.listdir(folder):
+        if (file_name.endswith("_documents.json") and file_name not in expected) or file_name in (CORPUS_NAME, INDEX_NAME):
+            os.remove(os.path.join(folder, file_name))
+            print(f"Removed stale: {file_name}")
+
+
+def write_packed(source, folder, max_tokens, overlap):
+    """Stream every disease into a single corpus.jsonl + corpus.idx (replaces the per-disease files)."""
+    def chunks():
+        for disease_name, data in iter_scraped(source):
+            yield from build_chunks(disease_name, data, max_tokens, overlap)
+
+    count, changed = write_corpus(chunks(), folder)
+    print(f"{'Wrote' if changed else 'Unchanged'}: {os.path.join(folder, CORPUS_NAME)} ({count} chunks)")
+    for file_name in os.listdir(folder):
+        if file_name.endswith("_documents.json"):
+            os.remove(os.path.join(folder, file_name))
+            print(f"Removed stale: {file_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk scraped disease pages for embedding.")
+    parser.add_argument("--input", default=input_folder, help="Folder of scraped JSON files or scraped_data.zip")
+    parser.add_argument("--output-folder", default=output_folder)
+    parser.add_argument("--format", choices=["files", "packed"], default="files",
+                        help="files: one <disease>_documents.json each; packed: one corpus.jsonl with an offset index")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help=f"0 keeps every section whole (default: {max_chunk_tokens} for packed, 0 for files)")
+    parser.add_argument("--overlap", type=int, default=chunk_overlap_tokens)
+    args = parser.parse_args()
+    if args.max_tokens is None:
+        args.max_tokens = max_chunk_tokens if args.format == "packed" else 0
+
+    # Ensure output folder exists
+    os.makedirs(args.output_folder, exist_ok=True)
+    if args.format == "packed":
+        write_packed(args.input, args.output_folder, args.max_tokens, args.overlap)
+    else:
+        write_files(args.input, args.output_folder, args.max_tokens, args.overlap)
 
-    # Save processed chunks as a JSON file
-    output_file = os.path.join(output_folder, f"{disease_name}_documents.json")
-    with open(output_file, "w", encoding="utf-8") as out_file:
-        json.dump(documents, out_file, indent=4, ensure_ascii=False)
 
-    print(f"Processed and saved: {output_file}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text):
+    """Fast token estimate: words and punctuation marks (close to a WordPiece/BPE count for English)."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def _shingles(text, size=3):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def _truncate(text, max_tokens):
+    """Keep whole sentences while they fit; cut the first sentence by words if even it does not."""
+    kept, used = [], 0
+    for sentence in SENTENCE_END.split(text):
+        tokens = count_tokens(sentence)
+        if used + tokens > max_tokens:
+            break
+        kept.append(sentence)
+        used += tokens
+    if kept:
+        return " ".join(kept)
+    words = text.split()
+    out, used = [], 0
+    for word in words:
+        tokens = count_tokens(word)
+        if used + tokens > max_tokens:
+            break
+        out.append(word)
+        used += tokens
+    return " ".join(out)
+
+
+def build_context(contents, scores=None, token_budget=1500, dedup_threshold=0.8, min_partial_tokens=40):
+    """Assemble retrieved chunks into a prompt context under a token budget.
+
+    Chunks are taken best score first; a chunk whose word-trigram Jaccard similarity with an
+    already selected chunk is at least dedup_threshold is dropped. The chunk that would overflow
+    the budget is truncated at a sentence boundary (if at least min_partial_tokens remain) and
+    the rest are left out. Returns the context text and its bookkeeping.
+    """
+    order = list(range(len(contents)))
+    if scores is not None:
+        order.sort(key=lambda i: scores[i], reverse=True)
+
+    selected, selected_shingles = [], []
+    used, duplicates, truncated = 0, 0, False
+    for i in order:
+        text = (contents[i] or "").strip()
+        if not text:
+            continue
+        shingles = _shingles(text)
+        if any(len(shingles & other) / max(1, len(shingles | other)) >= dedup_threshold for other in selected_shingles):
+            duplicates += 1
+            continue
+
+        tokens = count_tokens(text)
+        remaining = token_budget - used
+        if tokens > remaining:
+            truncated = True
+            if remaining >= min_partial_tokens:
+                text = _truncate(text, remaining)
+                if text:
+                    selected.append(text)
+                    used += count_tokens(text)
+            break
+        selected.append(text)
+        selected_shingles.append(shingles)
+        used += tokens
+
+    return {
+        "context": "\n".join(selected),
+        "tokens": used,
+        "chunks_used": len(selected),
+        "duplicates_dropped": duplicates,
+        "truncated": truncated,
+    }
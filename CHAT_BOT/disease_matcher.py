@@ -0,0 +1,112 @@
+import re
+import difflib
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+POSSESSIVE_PATTERN = re.compile(r"['\u2019]s\b")
+APOSTROPHE_PATTERN = re.compile(r"['\u2019]")
+
+
+def normalize_tokens(text):
+    """Lower-case word tokens with a simple plural strip, so "asthma attacks" matches "asthma attack".
+
+    Possessive 's and apostrophes are dropped first, so "Alzheimer's" matches the file-derived
+    name "alzheimers disease" instead of splitting into "alzheimer" + "s".
+    """
+    text = APOSTROPHE_PATTERN.sub("", POSSESSIVE_PATTERN.sub("", text.lower()))
+    tokens = []
+    for token in WORD_PATTERN.findall(text):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class DiseaseMatcher:
+    """Finds disease names mentioned in a question.
+
+    Exact matches use a word-level trie (Aho-Corasick style longest match, left to right); when
+    nothing matches exactly, word n-grams are compared to names of the same length with difflib
+    to catch misspellings. A match also covers the more specific names that contain it, so
+    "breast cancer" includes "recurrent breast cancer".
+    """
+
+    def __init__(self, disease_names, fuzzy_cutoff=0.88, min_fuzzy_length=5):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.min_fuzzy_length = min_fuzzy_length
+        self.trie = {}
+        self.names_by_length = {}
+        self._names = {}
+        for name in disease_names:
+            tokens = normalize_tokens(name)
+            if not tokens:
+                continue
+            key = " ".join(tokens)
+            self._names[key] = name
+            self.names_by_length.setdefault(len(tokens), []).append(key)
+            node = self.trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[None] = name
+        self.max_length = max(self.names_by_length, default=0)
+
+        # name -> every name whose tokens contain it as a contiguous run (itself included)
+        self.related = {}
+        for key, name in self._names.items():
+            padded = f" {key} "
+            self.related[name] = [other for other_key, other in self._names.items() if padded in f" {other_key} "]
+
+    def __len__(self):
+        return len(self._names)
+
+    def _exact(self, tokens):
+        found = []
+        i = 0
+        while i < len(tokens):
+            node, match, end = self.trie, None, i
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if None in node:
+                    match, end = node[None], j + 1
+            if match:
+                if match not in found:
+                    found.append(match)
+                i = end
+            else:
+                i += 1
+        return found
+
+    def _fuzzy(self, tokens):
+        best = None
+        for length in range(min(self.max_length, len(tokens)), 0, -1):
+            candidates = self.names_by_length.get(length)
+            if not candidates:
+                continue
+            for i in range(len(tokens) - length + 1):
+                phrase = " ".join(tokens[i : i + length])
+                if len(phrase) < self.min_fuzzy_length:
+                    continue
+                for key in difflib.get_close_matches(phrase, candidates, n=1, cutoff=self.fuzzy_cutoff):
+                    score = difflib.SequenceMatcher(None, phrase, key).ratio()
+                    if best is None or score > best[0]:
+                        best = (score, self._names[key])
+            if best:
+                break  # Prefer the longest matching phrase
+        return [best[1]] if best else []
+
+    def match(self, question):
+        """Return the disease names mentioned in question (longest exact matches, else one fuzzy match)."""
+        tokens = normalize_tokens(question)
+        found = self._exact(tokens) or self._fuzzy(tokens)
+        # Drop generic matches already covered by a more specific one ("cancer" next to "breast cancer")
+        return [name for name in found if not any(name != other and other in self.related[name] for other in found)]
+
+    def expand(self, names):
+        """Matched names plus the more specific names that contain them."""
+        expanded = []
+        for name in names:
+            for related in self.related.get(name, [name]):
+                if related not in expanded:
+                    expanded.append(related)
+        return expanded
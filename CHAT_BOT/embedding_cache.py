@@ -0,0 +1,136 @@
+import re
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+
+
+def normalize_query(text):
+    """Cache key for a query: lower-cased, whitespace collapsed, trailing punctuation dropped."""
+    return re.sub(r"\s+", " ", text).strip().lower().rstrip("?.! ")
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache in front of a SentenceTransformer, optionally backed by SQLite."""
+
+    def __init__(self, model, model_name, max_size=2048, db_path=None):
+        """Wrap model.encode; db_path persists embeddings across processes and restarts.
+
+        model may also be a zero-argument callable returning the model, which is then only
+        loaded on the first cache miss.
+        """
+        self._model = model
+        self.model_name = model_name
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, query TEXT NOT NULL, embedding BLOB NOT NULL, "
+                "PRIMARY KEY (model, query))"
+            )
+            self._db.commit()
+
+    @property
+    def model(self):
+        if not hasattr(self._model, "encode"):
+            self._model = self._model()
+        return self._model
+
+    def _remember(self, key, embedding):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key):
+        embedding = self._memory.get(key)
+        if embedding is not None:
+            self._memory.move_to_end(key)
+            return embedding
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT embedding FROM query_embeddings WHERE model = ? AND query = ?",
+                (self.model_name, key),
+            ).fetchone()
+            if row:
+                embedding = array("f", row[0]).tolist()
+                self.disk_hits += 1
+                self._remember(key, embedding)
+                return embedding
+        return None
+
+    def _store(self, pairs):
+        for key, embedding in pairs:
+            self._remember(key, embedding)
+        if self._db is not None and pairs:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, embedding) VALUES (?, ?, ?)",
+                [(self.model_name, key, array("f", embedding).tobytes()) for key, embedding in pairs],
+            )
+            self._db.commit()
+
+    def is_cached(self, query):
+        """True if encoding query would be a cache hit (does not touch the LRU order or counters)."""
+        key = normalize_query(query)
+        with self._lock:
+            if key in self._memory:
+                return True
+            if self._db is None:
+                return False
+            return self._db.execute(
+                "SELECT 1 FROM query_embeddings WHERE model = ? AND query = ?", (self.model_name, key)
+            ).fetchone() is not None
+
+    def encode(self, query):
+        """Return the query embedding as a list of floats."""
+        return self.encode_many([query])[0]
+
+    def encode_many(self, queries, batch_size=64):
+        """Embed many queries, running the model once over only the distinct uncached ones."""
+        keys = [normalize_query(query) for query in queries]
+        found = {}
+        missing = {}
+        with self._lock:
+            for key in keys:
+                if key in found or key in missing:
+                    continue
+                embedding = self._lookup(key)
+                if embedding is None:
+                    missing[key] = None
+                else:
+                    found[key] = embedding
+
+        if missing:
+            missing = list(missing)
+            vectors = self.model.encode(missing, batch_size=batch_size, show_progress_bar=False)
+            computed = [(key, [float(x) for x in vector]) for key, vector in zip(missing, vectors)]
+            with self._lock:
+                self._store(computed)
+            found.update(computed)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+        return [found[key] for key in keys]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._memory),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
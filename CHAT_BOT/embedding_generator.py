@@ -1,11 +1,16 @@
 import os
 import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import chromadb
-from chromadb.utils import embedding_functions
 from sentence_transformers import SentenceTransformer
+from chunk_store import ChunkStore, content_hash
 
 # Path to processed chunks
 input_folder = "/home/shtlp_0042/Desktop/RAG/processed_data"
+chroma_path = "/home/shtlp_0042/Desktop/RAG/chroma_db"
+manifest_name = "index_manifest.json"  # Stored next to the Chroma data
 
 # List of all MiniLM models
 minilm_models = [
@@ -14,44 +19,216 @@ minilm_models = [
     "sentence-transformers/all-MiniLM-L6-v1",
 ]
 
-# Initialize ChromaDB
-chroma_client = chromadb.PersistentClient(path="/home/shtlp_0042/Desktop/RAG/chroma_db")
+# Chunks per model.encode call and per collection.upsert call
+encode_batch_size = 256
+write_batch_size = 2000
 
-# Create a collection for each MiniLM model
-collections = {
-    model: chroma_client.get_or_create_collection(name=model.replace("/", "_"))
-    for model in minilm_models
-}
 
-# Get all processed JSON files
-json_files = [f for f in os.listdir(input_folder) if f.endswith("_documents.json")]
+def collection_name(model_name):
+    return model_name.replace("/", "_")
 
-for file_name in json_files:
-    file_path = os.path.join(input_folder, file_name)
 
-    # Load processed disease chunks
-    with open(file_path, "r", encoding="utf-8") as file:
-        chunks = json.load(file)
+def load_chunks(folder):
+    """Load every processed chunk once, in a stable order."""
+    store = ChunkStore(folder)
+    return sorted(store.all_chunks(), key=lambda chunk: chunk["chunk_id"])
 
-    # Embed and store using each MiniLM model
-    for model_name in minilm_models:
-        model = SentenceTransformer(model_name)
-        
-        for chunk in chunks:
-            chunk_id = chunk["chunk_id"]
-            metadata = chunk["metadata"]
-            text_content = chunk["content"]
 
-            # Generate embedding
-            embedding = model.encode(text_content).tolist()
+def load_manifest(path):
+    """Return {collection_name: {chunk_id: content_hash}} for everything already indexed."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            try:
+                manifest = json.load(file)
+                if isinstance(manifest, dict):
+                    return manifest
+            except json.JSONDecodeError:
+                pass
+    return {}
 
-            # Store in ChromaDB
-            collections[model_name].add(
-                ids=[chunk_id],
-                embeddings=[embedding],
-                metadatas=[metadata]
-            )
 
-    print(f"Embedded and stored chunks from {file_name}")
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, path)
 
-print("All disease chunks embedded and stored successfully! ")
+
+def indexed_state(collection, manifest_entry):
+    """What the collection holds. Falls back to the collection's own IDs when there is no manifest entry."""
+    if manifest_entry is not None:
+        return dict(manifest_entry)
+    ids = collection.get(include=[])["ids"]
+    return {chunk_id: None for chunk_id in ids}
+
+
+def plan_update(chunks, indexed):
+    """Split into (chunks to embed, IDs to delete) given {chunk_id: content_hash} already indexed."""
+    current = {}
+    to_embed = []
+    for chunk in chunks:
+        chunk_hash = content_hash(chunk["content"])
+        current[chunk["chunk_id"]] = chunk_hash
+        if chunk["chunk_id"] not in indexed:
+            to_embed.append(chunk)
+        elif indexed[chunk["chunk_id"]] not in (None, chunk_hash):
+            to_embed.append(chunk)
+    stale_ids = [chunk_id for chunk_id in indexed if chunk_id not in current]
+    return to_embed, stale_ids
+
+
+def encode_texts(model_name, texts, batch_size=encode_batch_size, num_threads=None):
+    """Load model_name once and encode all texts in batches. Runs in the parent or in a pool worker."""
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+    model = SentenceTransformer(model_name)
+    start = time.perf_counter()
+    embeddings = model.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return model_name, embeddings, time.perf_counter() - start
+
+
+def write_embeddings(collection, chunks, embeddings, batch_size=write_batch_size):
+    """Bulk upsert ids, embeddings, documents and metadata into a collection."""
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start : start + batch_size]
+        collection.upsert(
+            ids=[chunk["chunk_id"] for chunk in batch],
+            embeddings=embeddings[start : start + batch_size].tolist(),
+            documents=[chunk["content"] for chunk in batch],
+            metadatas=[chunk["metadata"] for chunk in batch],
+        )
+
+
+def delete_ids(collection, ids, batch_size=write_batch_size):
+    for start in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[start : start + batch_size])
+
+
+def index_chunks(chunks, collections, models, manifest=None, batch_size=encode_batch_size, workers=1,
+                 on_model_done=None, full=False):
+    """Embed new/changed chunks with every model, upsert them and delete stale IDs. Returns per-model stats.
+
+    manifest maps collection name -> {chunk_id: content_hash}; the entries of `models` are updated
+    in place and entries of other collections are left alone. full=True re-embeds every chunk.
+    """
+    manifest = {} if manifest is None else manifest
+
+    plans = {}
+    for model_name in models:
+        name = collection_name(model_name)
+        indexed = indexed_state(collections[model_name], None if full else manifest.get(name))
+        to_embed, stale_ids = plan_update(chunks, indexed)
+        if full:
+            to_embed = list(chunks)
+        plans[model_name] = (to_embed, stale_ids)
+        print(f"{model_name}: {len(to_embed)} to embed, {len(stale_ids)} stale, {len(chunks) - len(to_embed)} up to date")
+
+    stats = {}
+
+    def store(model_name, embeddings, encode_seconds):
+        to_embed, stale_ids = plans[model_name]
+        collection = collections[model_name]
+        start = time.perf_counter()
+        if to_embed:
+            write_embeddings(collection, to_embed, embeddings)
+        if stale_ids:
+            delete_ids(collection, stale_ids)
+        write_seconds = time.perf_counter() - start
+
+        manifest[collection_name(model_name)] = {chunk["chunk_id"]: content_hash(chunk["content"]) for chunk in chunks}
+        if on_model_done:
+            on_model_done(manifest)
+
+        stats[model_name] = {
+            "chunks": len(to_embed),
+            "deleted": len(stale_ids),
+            "encode_seconds": encode_seconds,
+            "write_seconds": write_seconds,
+            "chunks_per_sec": len(to_embed) / max(encode_seconds + write_seconds, 1e-9),
+        }
+        print(
+            f"{model_name}: {len(to_embed)} chunks, encode {encode_seconds:.1f}s, "
+            f"write {write_seconds:.1f}s, {stats[model_name]['chunks_per_sec']:.1f} chunks/sec"
+        )
+
+    pending = [model_name for model_name in models if plans[model_name][0]]
+    for model_name in models:
+        if model_name not in pending:
+            store(model_name, None, 0.0)
+
+    if workers > 1 and len(pending) > 1:
+        # One model per worker process; the parent does all Chroma writes
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(encode_texts, model_name, [chunk["content"] for chunk in plans[model_name][0]], batch_size, num_threads)
+                for model_name in pending
+            ]
+            for future in futures:
+                store(*future.result())
+    else:
+        for model_name in pending:
+            store(*encode_texts(model_name, [chunk["content"] for chunk in plans[model_name][0]], batch_size))
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed processed chunks into one Chroma collection per MiniLM model.")
+    parser.add_argument("--input-folder", default=input_folder)
+    parser.add_argument("--chroma-path", default=chroma_path)
+    parser.add_argument("--models", nargs="+", default=minilm_models)
+    parser.add_argument("--batch-size", type=int, default=encode_batch_size)
+    parser.add_argument("--workers", type=int, default=1, help="Process pool size (one model per worker)")
+    parser.add_argument("--full", action="store_true", help="Re-embed every chunk instead of only new or changed ones")
+    parser.add_argument("--quantized-dir", default=None, help="Also export each collection to a quantized index here")
+    parser.add_argument("--quantization", choices=["int8", "binary"], default="int8")
+    args = parser.parse_args()
+
+    # Initialize ChromaDB
+    chroma_client = chromadb.PersistentClient(path=args.chroma_path)
+
+    # Create a collection for each MiniLM model
+    collections = {
+        model: chroma_client.get_or_create_collection(name=collection_name(model))
+        for model in args.models
+    }
+
+    chunks = load_chunks(args.input_folder)
+    print(f"Loaded {len(chunks)} chunks from {args.input_folder}")
+
+    manifest_path = os.path.join(args.chroma_path, manifest_name)
+    manifest = load_manifest(manifest_path)  # Kept with --full too: other models' entries stay valid
+
+    start = time.perf_counter()
+    stats = index_chunks(
+        chunks,
+        collections,
+        args.models,
+        manifest,
+        args.batch_size,
+        min(args.workers, len(args.models)),
+        on_model_done=lambda updated: save_manifest(manifest_path, updated),
+        full=args.full,
+    )
+    elapsed = time.perf_counter() - start
+
+    total = sum(model_stats["chunks"] for model_stats in stats.values())
+    print(f"All disease chunks embedded and stored: {total} vectors in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.1f} chunks/sec)")
+
+    if args.quantized_dir:
+        from quantized_index import export_collection
+        for model, collection in collections.items():
+            meta = export_collection(collection, os.path.join(args.quantized_dir, collection_name(model)),
+                                     quantization=args.quantization)
+            print(f"Exported {meta['count']} {args.quantization} vectors for {model}")
+
+
+if __name__ == "__main__":
+    main()
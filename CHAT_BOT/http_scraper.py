@@ -0,0 +1,485 @@
+import os
+import gzip
+import json
+import time
+import string
+import threading
+import http.client
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, urldefrag
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rate_limit import TokenBucket, retry_with_backoff
+
+Response = namedtuple("Response", ["status", "headers", "body", "url"])
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+SKIP_TEXT_TAGS = {"script", "style", "noscript", "template"}
+CONTENT_TAGS = ["h2", "h3", "p", "ul"]
+# Same containers the Selenium scraper reads: //*[@id="main-content"]/div[1]/div[1]/div[2] (or div[3])
+MAIN_CONTENT_PATHS = [[("div", 1), ("div", 1), ("div", 2)], [("div", 1), ("div", 1), ("div", 3)]]
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+
+def is_transient(error):
+    if isinstance(error, HTTPStatusError):
+        return error.status in RETRYABLE_STATUS
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+class HTTPPool:
+    """Keep-alive http.client connections per host, shared by worker threads."""
+
+    def __init__(self, max_per_host=8, timeout=20.0):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme, netloc):
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(*key), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _request(self, key, path, headers):
+        connection, reused = self._acquire(key)
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, ConnectionError):
+            connection.close()
+            if not reused:
+                raise
+            # The server dropped an idle keep-alive connection: retry once on a fresh one
+            connection = self._connect(*key)
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+        return response, body
+
+    def get(self, url, headers=None, max_redirects=5):
+        headers = dict(headers or {}, **{"Accept-Encoding": "gzip"})
+        for _ in range(max_redirects + 1):
+            parts = urlsplit(url)
+            path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            response, body = self._request((parts.scheme, parts.netloc), path, headers)
+            response_headers = {name.lower(): value for name, value in response.getheaders()}
+            if response.status in (301, 302, 303, 307, 308) and "location" in response_headers:
+                url = urljoin(url, response_headers["location"])
+                continue
+            if response_headers.get("content-encoding") == "gzip":
+                body = gzip.decompress(body)
+            return Response(response.status, response_headers, body, url)
+        raise HTTPStatusError(310, url)  # Too many redirects
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for connection in idle:
+                    connection.close()
+            self._idle.clear()
+
+
+class Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.children = []
+        self.parent = parent
+
+    def elements(self, tag=None):
+        return [child for child in self.children if isinstance(child, Node) and (tag is None or child.tag == tag)]
+
+    def iter(self, tag=None):
+        for child in self.children:
+            if isinstance(child, Node):
+                if tag is None or child.tag == tag:
+                    yield child
+                yield from child.iter(tag)
+
+    def find_id(self, element_id):
+        return next((node for node in self.iter() if node.attrs.get("id") == element_id), None)
+
+    def text(self):
+        """Whitespace-collapsed text of the subtree (what Selenium's element.text gives for these pages)."""
+        parts = []
+
+        def collect(node):
+            for child in node.children:
+                if isinstance(child, str):
+                    parts.append(child)
+                elif child.tag == "br":
+                    parts.append("\n")
+                elif child.tag not in SKIP_TEXT_TAGS:
+                    collect(child)
+
+        collect(self)
+        return " ".join("".join(parts).split())
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document")
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("p", "li") and self.current.tag == tag:  # Implicitly closed <p>/<li>
+            self.current = self.current.parent
+        node = Node(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Node(tag, {name: value or "" for name, value in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(html):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def links(root, base_url):
+    """[(absolute URL without fragment, link text)] for every <a href>."""
+    return [
+        (urldefrag(urljoin(base_url, node.attrs["href"]))[0], node.text())
+        for node in root.iter("a") if node.attrs.get("href")
+    ]
+
+
+def extract_sections(container):
+    """Heading -> text of the following paragraphs and lists (HTML twin of SeleniumScraper.get_disease_data)."""
+    data = {}
+    key, value = "", ""
+    for element in container.elements():
+        if element.tag not in CONTENT_TAGS:
+            continue
+        if element.tag in ("h2", "h3"):
+            if value:
+                data[key] = value.strip()
+                value = ""
+            key = element.text()
+        elif element.tag == "p":
+            value += element.text() + " "
+        else:
+            value += " ".join(li.text() for li in element.iter("li")) + " "
+    if value:
+        data[key] = value.strip()
+    return data
+
+
+def main_content_sections(root, required=None):
+    """Sections of the first main-content container that exists (and contains `required`, if given)."""
+    main = root.find_id("main-content")
+    sections = {}
+    for path in MAIN_CONTENT_PATHS:
+        node = main
+        for tag, position in path:
+            children = node.elements(tag) if node is not None else []
+            node = children[position - 1] if len(children) >= position else None
+        if node is None:
+            continue
+        sections = extract_sections(node)
+        if required is None or required in sections:
+            break
+    return sections
+
+
+class CrawlState:
+    """Resumable crawl progress and HTTP validators, saved atomically as JSON.
+
+    A run that was interrupted is resumed: pages finished since it started are skipped. Once a
+    run completes, the next one revisits every page with conditional requests.
+    """
+
+    def __init__(self, path, save_every=20):
+        self.path = path
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        state = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        self.letters = state.get("letters", {})
+        self.pages = state.get("pages", {})
+        self.run = state.get("run") or {}
+        self.resumed = bool(self.run) and not self.run.get("completed")
+        if not self.resumed:
+            self.run = {"started": time.time(), "completed": False}
+
+    def done(self, section, url):
+        entry = getattr(self, section).get(url)
+        return bool(entry) and entry.get("status") != "failed" and entry.get("crawled_at", 0) >= self.run["started"]
+
+    def get(self, section, url):
+        return getattr(self, section).get(url, {})
+
+    def update(self, section, url, **fields):
+        with self._lock:
+            entry = getattr(self, section).setdefault(url, {})
+            entry.update(fields, crawled_at=time.time())
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"run": self.run, "letters": self.letters, "pages": self.pages}, f, indent=1)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+    def save(self, completed=False):
+        with self._lock:
+            if completed:
+                self.run["completed"] = True
+            self._save()
+
+
+class HTTPScraper:
+    """Parallel HTTP scraper for the disease pages, with the Selenium scraper as a fallback.
+
+    Letter index pages and disease/diagnosis pages are fetched over a pooled keep-alive client by
+    `workers` threads, each host limited to requests_per_minute. Validators (ETag/Last-Modified)
+    are kept in the crawl state so unchanged pages come back as 304 and are not rewritten. Pages
+    whose content is not in the static HTML are rendered by fallback().fetch_rendered(url); fallback
+    is a zero-argument callable (e.g. starting a headless SeleniumScraper) called on first need.
+    """
+
+    def __init__(self, start_url, output_folder="scraped_data", state_file="crawl_state.json", workers=4,
+                 requests_per_minute=60, burst=2, fallback=None, letters=None, timeout=20.0,
+                 user_agent="Mozilla/5.0 (compatible; medical-rag-scraper)"):
+        self.start_url = start_url
+        self.disease_prefix = urljoin(start_url, "/diseases-conditions/")
+        self.output_folder = output_folder
+        self.workers = workers
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.letters = [letter.upper() for letter in letters] if letters else None
+        self.user_agent = user_agent
+        self.http = HTTPPool(max_per_host=workers, timeout=timeout)
+        self.state = CrawlState(state_file)
+        self.failed_urls = []
+        self.scraped_data = {}
+        self._fallback = fallback
+        self._fallback_lock = threading.Lock()
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        os.makedirs(output_folder, exist_ok=True)
+
+    def _bucket(self, host):
+        with self._buckets_lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.requests_per_minute, self.burst)
+            return self._buckets[host]
+
+    def fetch(self, url, validators=None):
+        """GET with per-host rate limiting, retries on transient errors and conditional headers."""
+        headers = {"User-Agent": self.user_agent}
+        if validators and validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators and validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        def call():
+            wait = self._bucket(urlsplit(url).netloc).reserve(1)
+            if wait:
+                time.sleep(wait)
+            response = self.http.get(url, headers)
+            if response.status >= 400:
+                raise HTTPStatusError(response.status, url)
+            return response
+
+        return retry_with_backoff(call, retries=4, base_delay=1.0, max_delay=30.0, should_retry=is_transient)
+
+    def render(self, url):
+        """Fetch through the Selenium fallback (one browser, used by one thread at a time)."""
+        if self._fallback is None:
+            return None
+        with self._fallback_lock:
+            if not hasattr(self._fallback, "fetch_rendered"):
+                self._fallback = self._fallback()
+            return self._fallback.fetch_rendered(url)
+
+    @staticmethod
+    def validators(response):
+        return {"etag": response.headers.get("etag"), "last_modified": response.headers.get("last-modified")}
+
+    def letter_pages(self):
+        """[(letter, URL)] of the A-Z index links on the start page."""
+        root = parse_html(self.fetch(self.start_url).body.decode("utf-8", "replace"))
+        pages = {}
+        for url, text in links(root, self.start_url):
+            if len(text) == 1 and text in string.ascii_uppercase and text not in pages:
+                pages[text] = url
+        return [(letter, pages[letter]) for letter in string.ascii_uppercase
+                if letter in pages and (self.letters is None or letter in self.letters)]
+
+    def is_disease_url(self, url):
+        return url.startswith(self.disease_prefix) and len(url) >= 3 and url[-3].isdigit()
+
+    def disease_urls(self, letter_url):
+        if self.state.done("letters", letter_url):
+            return self.state.get("letters", letter_url)["diseases"]
+        response = self.fetch(letter_url)
+        root = parse_html(response.body.decode("utf-8", "replace"))
+        urls = list(dict.fromkeys(url for url, _ in links(root, response.url) if self.is_disease_url(url)))
+        self.state.update("letters", letter_url, diseases=urls, status="done")
+        return urls
+
+    def _output_path(self, url):
+        return os.path.join(self.output_folder, f"{url.split('/')[4].replace('-', ' ')}.json")
+
+    def _previous(self, path):
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _page(self, url, entry_prefix, entry, previous, required=None):
+        """(sections or None if unchanged, validators) for one page, rendering it if the HTML lacks the content."""
+        conditional = {"etag": entry.get(f"{entry_prefix}etag"), "last_modified": entry.get(f"{entry_prefix}last_modified")}
+        response = self.fetch(url, conditional if previous is not None else None)
+        if response.status == 304:
+            return None, conditional, None
+        root = parse_html(response.body.decode("utf-8", "replace"))
+        sections = main_content_sections(root, required)
+        if not sections or (required and required not in sections):
+            html = self.render(url)
+            if html:
+                root = parse_html(html)
+                sections = main_content_sections(root, required)
+        return sections, self.validators(response), root
+
+    def scrape_disease(self, url):
+        """Scrape one disease (overview + diagnosis page). Returns saved/unchanged/skipped/failed."""
+        disease_name = url.split("/")[4].replace("-", " ")
+        output_path = self._output_path(url)
+        previous = self._previous(output_path)
+        entry = self.state.get("pages", url)
+        try:
+            overview, overview_validators, root = self._page(url, "", entry, previous, required="Symptoms")
+            if overview is not None and "Symptoms" not in overview:
+                print(f"Skipping {disease_name}: Symptoms data not found")
+                self.state.update("pages", url, status="skipped")
+                return "skipped"
+
+            diagnosis_url = entry.get("diagnosis_url")
+            if root is not None:
+                diagnosis_url = next((link for link, text in links(root, url) if text == "Diagnosis & treatment"), None)
+            # Overview unchanged and no known diagnosis link: keep the saved diagnosis section
+            diagnosis = {} if root is not None else None
+            diagnosis_validators = {}
+            if diagnosis_url:
+                diagnosis, diagnosis_validators, _ = self._page(diagnosis_url, "diagnosis_", entry, previous)
+
+            if overview is None and diagnosis is None:
+                self.scraped_data[url] = previous
+                status = "unchanged"
+            else:
+                data = {
+                    "Overview": overview if overview is not None else previous["Overview"],
+                    "Diagnosis and Treatment": diagnosis if diagnosis is not None else previous["Diagnosis and Treatment"],
+                }
+                tmp_path = output_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=4)
+                os.replace(tmp_path, output_path)
+                self.scraped_data[url] = data
+                status = "saved"
+                print(f"Data saved for {disease_name}")
+
+            self.state.update(
+                "pages", url, status=status, diagnosis_url=diagnosis_url,
+                etag=overview_validators.get("etag"), last_modified=overview_validators.get("last_modified"),
+                diagnosis_etag=diagnosis_validators.get("etag"),
+                diagnosis_last_modified=diagnosis_validators.get("last_modified"),
+            )
+            return status
+        except Exception as e:
+            print(f"Error scraping {url}: {e}")
+            self.failed_urls.append(url)
+            self.state.update("pages", url, status="failed", error=str(e))
+            return "failed"
+
+    def crawl(self):
+        """Crawl every letter; returns counts per page status."""
+        if self.state.resumed:
+            print("Resuming the previous crawl")
+        counts = {"saved": 0, "unchanged": 0, "skipped": 0, "failed": 0, "resumed": 0}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            letter_futures = {pool.submit(self.disease_urls, url): letter for letter, url in self.letter_pages()}
+            disease_urls = []
+            for future in as_completed(letter_futures):
+                try:
+                    disease_urls.extend(future.result())
+                    print(f"Processed alphabet: {letter_futures[future]}")
+                except Exception as e:
+                    print(f"Error loading alphabet {letter_futures[future]}: {e}")
+
+            pending = []
+            for url in dict.fromkeys(disease_urls):
+                if self.state.done("pages", url):
+                    counts["resumed"] += 1
+                else:
+                    pending.append(url)
+            for future in as_completed([pool.submit(self.scrape_disease, url) for url in pending]):
+                counts[future.result()] += 1
+
+        self.state.save(completed=not self.failed_urls)
+        return counts
+
+    def close(self):
+        self.http.close()
+        self.state.save()
+        if hasattr(self._fallback, "fetch_rendered"):
+            self._fallback.quit()  # Browser started by render()
+        if self.failed_urls:
+            with open("failed_urls.txt", "w") as f:
+                for url in self.failed_urls:
+                    f.write(url + "\n")
+        with open("full_scraped_data.json", "w") as f:
+            json.dump(self.scraped_data, f, indent=4)
@@ -0,0 +1,152 @@
+import os
+import glob
+import json
+import queue
+import atexit
+import datetime
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+
+class InteractionLog:
+    """Append-only JSON Lines log written by a background thread.
+
+    Entries are queued by append() and written in batches under an exclusive file lock, so several
+    Streamlit processes can share one log. The active file is rotated to
+    <name>.<YYYYMMDD-HHMMSS-ffffff>.jsonl when it grows past max_bytes or when the day changes.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, rotate_daily=True, flush_interval=0.5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._base, self._ext = os.path.splitext(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="interaction-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, entry):
+        """Queue one entry; it reaches disk within flush_interval seconds."""
+        self._queue.put(entry)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def _drain(self):
+        entries = []
+        while True:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                return entries
+
+    def _lock_file(self):
+        handle = open(self.path + ".lock", "a")
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def _unlock_file(self, handle):
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+    def _rotated_files(self):
+        return sorted(glob.glob(f"{glob.escape(self._base)}.*{self._ext}"))
+
+    def _maybe_rotate(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_size == 0:
+            return
+        modified = datetime.datetime.fromtimestamp(stat.st_mtime)
+        too_big = self.max_bytes and stat.st_size >= self.max_bytes
+        new_day = self.rotate_daily and modified.date() != datetime.date.today()
+        if too_big or new_day:
+            suffix = modified.strftime("%Y%m%d-%H%M%S-%f")
+            target = f"{self._base}.{suffix}{self._ext}"
+            n = 1
+            while os.path.exists(target):
+                target = f"{self._base}.{suffix}-{n}{self._ext}"
+                n += 1
+            os.replace(self.path, target)
+
+    def flush(self):
+        """Write every queued entry now."""
+        with self._write_lock:
+            entries = self._drain()
+            if not entries:
+                return
+            lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+            handle = self._lock_file()
+            try:
+                self._maybe_rotate()
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(lines)
+            finally:
+                self._unlock_file(handle)
+
+    def _tail_file(self, path, count):
+        """Last `count` parsed lines of one file, read backwards in blocks."""
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return []
+        with file:
+            file.seek(0, os.SEEK_END)
+            position = file.tell()
+            data = b""
+            while position > 0 and data.count(b"\n") <= count:
+                step = min(64 * 1024, position)
+                position -= step
+                file.seek(position)
+                data = file.read(step) + data
+        entries = []
+        for line in data.splitlines()[-count:]:
+            try:
+                entries.append(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue  # Partial first line or a torn write
+        return entries
+
+    def tail(self, count):
+        """Return the last `count` entries, oldest first, reading into rotated files if needed."""
+        if count <= 0:
+            return []
+        self.flush()
+        entries = self._tail_file(self.path, count)
+        for path in reversed(self._rotated_files()):
+            if len(entries) >= count:
+                break
+            entries = self._tail_file(path, count - len(entries)) + entries
+        return entries[-count:]
+
+    def clear(self):
+        """Delete the active log and every rotated file."""
+        with self._write_lock:
+            self._drain()
+            handle = self._lock_file()
+            try:
+                for path in [self.path] + self._rotated_files():
+                    if os.path.exists(path):
+                        os.remove(path)
+            finally:
+                self._unlock_file(handle)
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
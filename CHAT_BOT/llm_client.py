@@ -0,0 +1,226 @@
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import Future
+from context_builder import SENTENCE_END
+from rate_limit import estimate_tokens, is_quota_error, retry_with_backoff, backoff_delay
+
+
+class GeminiBackend:
+    """One long-lived Gemini model handle; every call carries a request timeout."""
+
+    def __init__(self, model_name="gemini-2.0-flash", api_key=None):
+        import google.generativeai as genai
+        if api_key:
+            genai.configure(api_key=api_key)
+        self.name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    @staticmethod
+    def _text(part):
+        try:
+            return part.text or ""
+        except ValueError:  # No text in this candidate (e.g. blocked by safety filters)
+            return ""
+
+    def generate(self, prompt, timeout=None):
+        options = {"timeout": timeout} if timeout else None
+        return self._text(self.model.generate_content(prompt, request_options=options))
+
+    def stream(self, prompt, timeout=None):
+        options = {"timeout": timeout} if timeout else None
+        for part in self.model.generate_content(prompt, stream=True, request_options=options):
+            text = self._text(part)
+            if text:
+                yield text
+
+
+class StubError(Exception):
+    """Injected failure; the message looks like a 503 so the client retries it."""
+
+
+class StubBackend:
+    """Deterministic offline backend: no network, no API key, configurable latency.
+
+    The answer is the first sentences of the prompt's context (so the same prompt always gets the
+    same answer). Latency per call is drawn from `distribution` ("fixed", "uniform", "exponential"
+    or "lognormal") around `latency` seconds, using a seeded RNG; error_rate injects retryable
+    failures. A call whose drawn latency exceeds the timeout raises TimeoutError after the timeout.
+    """
+
+    def __init__(self, latency=0.0, distribution="fixed", spread=0.5, error_rate=0.0, seed=0,
+                 first_token_share=0.3, stream_chunks=4, max_words=60):
+        self.name = "stub"
+        self.latency = latency
+        self.distribution = distribution
+        self.spread = spread
+        self.error_rate = error_rate
+        self.first_token_share = first_token_share
+        self.stream_chunks = stream_chunks
+        self.max_words = max_words
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self):
+        with self._lock:
+            if self.distribution == "uniform":
+                return self._rng.uniform(self.latency * (1 - self.spread), self.latency * (1 + self.spread))
+            if self.distribution == "exponential":
+                return self._rng.expovariate(1.0 / self.latency) if self.latency else 0.0
+            if self.distribution == "lognormal":
+                # Median `latency`, heavier right tail as spread grows
+                return self.latency * self._rng.lognormvariate(0.0, self.spread) if self.latency else 0.0
+            return self.latency
+
+    def _fail(self):
+        with self._lock:
+            failed = self.error_rate and self._rng.random() < self.error_rate
+        if failed:
+            raise StubError("503 stub backend overloaded")
+
+    def answer(self, prompt):
+        context = prompt.split("Context:", 1)[-1].split("\nQuestion:", 1)[0].strip()
+        words = " ".join(SENTENCE_END.split(context)[:2]).split()[: self.max_words]
+        if not words:
+            digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+            return f"I could not find this in the provided context ({digest})."
+        return " ".join(words)
+
+    def _sleep(self, seconds, timeout, started):
+        if timeout and time.perf_counter() - started + seconds > timeout:
+            time.sleep(max(0.0, timeout - (time.perf_counter() - started)))
+            raise TimeoutError(f"stub call exceeded {timeout}s")
+        time.sleep(seconds)
+
+    def generate(self, prompt, timeout=None):
+        started = time.perf_counter()
+        self._fail()
+        self._sleep(self.sample_latency(), timeout, started)
+        return self.answer(prompt)
+
+    def stream(self, prompt, timeout=None):
+        started = time.perf_counter()
+        self._fail()
+        latency = self.sample_latency()
+        words = self.answer(prompt).split(" ")
+        size = max(1, -(-len(words) // self.stream_chunks))
+        parts = [" ".join(words[i : i + size]) + " " for i in range(0, len(words), size)]
+        self._sleep(latency * self.first_token_share, timeout, started)
+        for index, part in enumerate(parts):
+            if index:
+                self._sleep(latency * (1 - self.first_token_share) / max(1, len(parts) - 1), timeout, started)
+            yield part if index < len(parts) - 1 else part.rstrip()
+
+
+def make_backend(kind="gemini", **options):
+    """Backend by name: "gemini" (model_name, api_key) or "stub" (latency, distribution, ...)."""
+    if kind == "stub":
+        return StubBackend(**options)
+    return GeminiBackend(**options)
+
+
+class LLMClient:
+    """Shared generation client: timeouts, jittered retries, quota limiting and in-flight coalescing.
+
+    Identical prompts that arrive while a call for them is still running wait for that call
+    instead of issuing their own (streaming calls are not coalesced: each needs its own stream).
+    """
+
+    def __init__(self, backend, timeout=30.0, retries=3, base_delay=1.0, max_delay=20.0,
+                 rate_limiter=None, expected_output_tokens=512, coalesce=True):
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = rate_limiter
+        self.expected_output_tokens = expected_output_tokens
+        self.coalesce = coalesce
+        self.calls = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failures = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def should_retry(error):
+        return isinstance(error, TimeoutError) or is_quota_error(error)
+
+    def _acquire(self, prompt):
+        if self.rate_limiter:
+            self.rate_limiter.acquire(estimate_tokens(prompt) + self.expected_output_tokens)
+
+    def _call(self, prompt):
+        attempts = 0
+
+        def call():
+            nonlocal attempts
+            attempts += 1
+            self._acquire(prompt)
+            return self.backend.generate(prompt, self.timeout)
+
+        try:
+            return retry_with_backoff(call, self.retries, self.base_delay, self.max_delay, self.should_retry)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                self.calls += attempts
+                self.retried += max(0, attempts - 1)
+
+    def generate(self, prompt):
+        """Answer text for prompt (shared with any identical prompt already in flight)."""
+        if not self.coalesce:
+            return self._call(prompt)
+
+        key = hashlib.sha1(f"{self.backend.name}\x1f{prompt}".encode("utf-8")).hexdigest()
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            text = self._call(prompt)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stream(self, prompt):
+        """Yield answer text chunks; failures before the first chunk are retried with backoff."""
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                self._acquire(prompt)
+                with self._lock:
+                    self.calls += 1
+                for text in self.backend.stream(prompt, self.timeout):
+                    started = True
+                    yield text
+                return
+            except Exception as e:
+                if started or attempt == self.retries or not self.should_retry(e):
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                with self._lock:
+                    self.retried += 1
+                time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.backend.name, "calls": self.calls, "coalesced": self.coalesced,
+                    "retried": self.retried, "failures": self.failures, "in_flight": len(self._inflight)}
@@ -1,93 +1,233 @@
-import streamlit as st
-import chromadb
-import google.generativeai as genai
+import time
+
+script_start = time.perf_counter()
+
 import os
-import json
 import datetime
-from sentence_transformers import SentenceTransformer
+import streamlit as st
+from chunk_store import ChunkStore
+from embedding_cache import QueryEmbeddingCache
+from answer_cache import SemanticAnswerCache
+from interaction_log import InteractionLog
+from retrieval import Retriever, CollectionSource
+from reranker import CrossEncoderReranker
+from rag_engine import RAGEngine
+from metrics import MetricsRecorder
+
+# Paths
+chroma_path = "/home/shtlp_0042/Desktop/RAG/chroma_db"
+chunks_folder = "/home/shtlp_0042/Desktop/RAG/processed_data"
+log_file = "/home/shtlp_0042/Desktop/RAG/rag_log.jsonl"
+history_size = 50  # Chat history entries shown in the sidebar
+stream_answers = True  # Render Gemini output token by token
+css_file = "/home/shtlp_0042/Desktop/RAG/style.css"
+query_cache_file = "/home/shtlp_0042/Desktop/RAG/query_embeddings.sqlite"
+metrics_file = "/home/shtlp_0042/Desktop/RAG/rag_metrics.jsonl"  # Per-request trace records
+prometheus_file = "/home/shtlp_0042/Desktop/RAG/rag_metrics.prom"  # Prometheus text exposition
+profile_dir = "/home/shtlp_0042/Desktop/RAG/profiles"
+profile_requests = False  # Capture a pyinstrument/cProfile report for every query
+quantized_index_dir = "/home/shtlp_0042/Desktop/RAG/quantized_index"  # Written by quantized_index.py
+onnx_dir = "/home/shtlp_0042/Desktop/RAG/onnx_models"  # Written by onnx_encoder.py
 
-# Configure Gemini API
-genai.configure(api_key="YOUR_API_KEY")
+# Models
+embedding_model_name = "sentence-transformers/all-MiniLM-L6-v2"
+collection_name = "sentence-transformers_all-MiniLM-L6-v2"
+encoder_backend = "torch"  # "onnx" or "onnx-int8": ONNX Runtime export, no torch import at startup
+gemini_model_name = "gemini-2.0-flash"
 
-# Load MiniLM model for query embedding
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# LLM: "gemini" or "stub" (deterministic offline answers with stub_latency seconds per call, no API key)
+llm_backend = "gemini"
+stub_latency = 0.5
+llm_timeout = 30.0  # Seconds per Gemini request; timed-out and 429/503 calls are retried with jittered backoff
+llm_retries = 3
 
-# Initialize ChromaDB client
-chroma_client = chromadb.PersistentClient(path="/home/shtlp_0042/Desktop/RAG/chroma_db")
+# Ensemble retrieval: collections built by embedding_generator.py, each queried in parallel with its
+# own encoder and fused with weighted RRF (model name -> weight; collection = model name with "/" -> "_")
+ensemble_models = {
+    "sentence-transformers/all-MiniLM-L6-v2": 1.0,
+    "sentence-transformers/all-MiniLM-L12-v2": 1.0,
+    "sentence-transformers/all-MiniLM-L6-v1": 1.0,
+}
+ensemble_collections = []  # Collections queried per question ([] = collection_name alone)
 
-# Load collection
-collection = chroma_client.get_or_create_collection(name="sentence-transformers_all-MiniLM-L6-v2")
+# Vector store: "chroma" or "quantized" (memory-mapped int8/binary index with exact re-scoring)
+vector_backend = "chroma"
 
-# Paths
-chunks_folder = "/home/shtlp_0042/Desktop/RAG/processed_data"
-log_file = "/home/shtlp_0042/Desktop/RAG/rag_log.json"
-css_file = "/home/shtlp_0042/Desktop/RAG/style.css"
+# Retrieval: "dense" (Chroma only), "sparse" (BM25 only) or "hybrid" (both, fused with RRF)
+retrieval_mode = "hybrid"
+retrieval_candidates = 20  # Per-retriever candidates fed into the fusion
+dense_weight, sparse_weight = 1.0, 1.0
+disease_filter = True  # Search only the chunks of a disease named in the question
+use_reranker = False  # Re-score rerank_candidates chunks with a cross-encoder, keep the best 5
+rerank_candidates = 30
+rerank_latency_budget = 0.5  # Seconds; unscored candidates keep their retrieval order
+context_token_budget = 1500  # Max estimated tokens of retrieved context sent to Gemini
+batch_window = 0.005  # Seconds concurrent queries wait to share one encode and one Chroma query
+
+# Load times of the process-wide resources and the duration of every script run
+@st.cache_resource
+def load_timings():
+    return {"loads": {}, "runs": []}
+
+timings = load_timings()
+
+# Heavy libraries are imported inside the loaders below, so a rerun that never
+# needs them (e.g. a sidebar click) doesn't pay for them. Each loader runs once per process.
+
+# Load MiniLM model for query embedding (PyTorch or the ONNX Runtime export)
+@st.cache_resource
+def load_embedding_model():
+    start = time.perf_counter()
+    from onnx_encoder import load_encoder
+    model = load_encoder(embedding_model_name, encoder_backend, onnx_dir)
+    timings["loads"]["embedding_model"] = time.perf_counter() - start
+    return model
+
+# Load a ChromaDB collection (or the quantized index exported from it), once per name
+@st.cache_resource
+def open_collection(name):
+    start = time.perf_counter()
+    if vector_backend == "quantized":
+        from quantized_index import QuantizedVectorIndex
+        collection = QuantizedVectorIndex(os.path.join(quantized_index_dir, name))
+        timings["loads"][f"quantized_index {name}"] = time.perf_counter() - start
+        return collection
+    import chromadb
+    chroma_client = chromadb.PersistentClient(path=chroma_path)
+    collection = chroma_client.get_or_create_collection(name=name)
+    timings["loads"][f"chroma_collection {name}"] = time.perf_counter() - start
+    return collection
+
+def load_collection():
+    return open_collection(collection_name)
+
+# One LLM client (and one model handle) per process; identical in-flight prompts share a call
+@st.cache_resource
+def load_llm_client():
+    start = time.perf_counter()
+    from llm_client import LLMClient, make_backend
+    if llm_backend == "stub":
+        backend = make_backend("stub", latency=stub_latency)
+    else:
+        backend = make_backend("gemini", model_name=gemini_model_name, api_key="YOUR_API_KEY")
+    client = LLMClient(backend, timeout=llm_timeout, retries=llm_retries)
+    timings["loads"]["llm_client"] = time.perf_counter() - start
+    return client
+
+# Read external CSS once
+@st.cache_data
+def read_css(file_name):
+    with open(file_name, "r") as f:
+        return f.read()
 
 # Load external CSS
 def load_css(file_name):
-    with open(file_name, "r") as f:
-        css = f.read()
-    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
-
-# Function to fetch content using chunk ID
-def get_chunk_content(chunk_id):
-    for file_name in os.listdir(chunks_folder):
-        if file_name.endswith("_documents.json"):
-            file_path = os.path.join(chunks_folder, file_name)
-            with open(file_path, "r", encoding="utf-8") as file:
-                chunks = json.load(file)
-                for chunk in chunks:
-                    if chunk["chunk_id"] == chunk_id:
-                        return chunk["content"]
-    return None
+    st.markdown(f"<style>{read_css(file_name)}</style>", unsafe_allow_html=True)
+
+# Load the chunk index once per process (reloads itself when processed_data changes)
+@st.cache_resource
+def load_chunk_store():
+    start = time.perf_counter()
+    store = ChunkStore(chunks_folder)
+    timings["loads"]["chunk_store"] = time.perf_counter() - start
+    return store
+
+chunk_store = load_chunk_store()
+
+# Query embedding cache shared by every session in this process; the model loads on the first miss
+@st.cache_resource
+def load_query_encoder():
+    from onnx_encoder import cache_model_name
+    return QueryEmbeddingCache(load_embedding_model, cache_model_name(embedding_model_name, encoder_backend),
+                               db_path=query_cache_file)
+
+query_encoder = load_query_encoder()
+
+# Ensemble collections, each with its own query encoder; nothing loads until a question uses it
+@st.cache_resource
+def load_ensemble_sources():
+    from onnx_encoder import load_encoder, cache_model_name
+    sources = {}
+    for model_name, weight in ensemble_models.items():
+        name = model_name.replace("/", "_")
+        if name == collection_name:
+            sources[name] = CollectionSource(load_collection, query_encoder, weight)
+            continue
+        encoder = QueryEmbeddingCache(lambda model_name=model_name: load_encoder(model_name, encoder_backend, onnx_dir),
+                                      cache_model_name(model_name, encoder_backend), db_path=query_cache_file)
+        sources[name] = CollectionSource(lambda name=name: open_collection(name), encoder, weight)
+    return sources
+
+# Answers for near-duplicate questions, dropped when their source chunks leave the index
+@st.cache_resource
+def load_answer_cache():
+    return SemanticAnswerCache(threshold=0.92, ttl_seconds=24 * 3600, max_size=1000, is_valid=chunk_store.contains_all)
+
+answer_cache = load_answer_cache()
+
+# Dense + BM25 retriever with disease pre-filtering
+@st.cache_resource
+def load_retriever():
+    retriever = Retriever(load_collection, chunk_store, query_encoder, mode=retrieval_mode,
+                          candidates=retrieval_candidates, dense_weight=dense_weight, sparse_weight=sparse_weight,
+                          disease_filter=disease_filter, rerank_candidates=rerank_candidates,
+                          sources=load_ensemble_sources(), collections=ensemble_collections,
+                          reranker=CrossEncoderReranker(latency_budget=rerank_latency_budget) if use_reranker else None)
+    retriever.refresh_indexes()  # Build BM25 and the disease matcher up front
+    return retriever
+
+retriever = load_retriever()
+
+# Per-stage tracing and rolling latency percentiles
+@st.cache_resource
+def load_metrics():
+    return MetricsRecorder(metrics_file, prometheus_file, profile_dir=profile_dir)
+
+metrics = load_metrics()
+
+# One append-only log writer per process
+@st.cache_resource
+def load_interaction_log():
+    return InteractionLog(log_file)
+
+interaction_log = load_interaction_log()
+
+# retrieve -> assemble -> generate; concurrent sessions share encode and Chroma calls
+@st.cache_resource
+def load_engine():
+    return RAGEngine(query_encoder, retriever, load_llm_client, answer_cache, n_results=5,
+                     context_token_budget=context_token_budget, batch_window=batch_window)
+
+engine = load_engine()
 
 # Function to log interactions
-def log_interaction(user_query, retrieved_context, generated_answer):
+def log_interaction(user_query, retrieved_context, generated_answer, timings=None):
     log_data = {
         "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "query": user_query,
         "retrieved_context": retrieved_context,
         "generated_answer": generated_answer,
     }
+    if timings:
+        log_data.update(timings)
 
-    # Load existing log file or create a new one
-    if os.path.exists(log_file):
-        with open(log_file, "r", encoding="utf-8") as file:
-            try:
-                logs = json.load(file)
-                if not isinstance(logs, list):
-                    logs = []
-            except json.JSONDecodeError:
-                logs = []
-    else:
-        logs = []
-
-    logs.append(log_data)
-
-    with open(log_file, "w", encoding="utf-8") as file:
-        json.dump(logs, file, indent=4, ensure_ascii=False)
+    # Append one line; the writer thread flushes it to disk
+    interaction_log.append(log_data)
 
     # Also update session state for chat history
     st.session_state.chat_history.append({"query": user_query, "answer": generated_answer})
 
-# Load previous chat history from log file on startup
+# Load the most recent chat history from the end of the log on startup
 def load_chat_history():
-    if os.path.exists(log_file):
-        with open(log_file, "r", encoding="utf-8") as file:
-            try:
-                logs = json.load(file)
-                if isinstance(logs, list):
-                    return [{"query": log["query"], "answer": log["generated_answer"]} for log in logs]
-            except json.JSONDecodeError:
-                return []
-    return []
+    logs = interaction_log.tail(history_size)
+    return [{"query": log["query"], "answer": log["generated_answer"]} for log in logs if "query" in log]
 
 # Load CSS for styling
 load_css(css_file)
 
 # Initialize session state for chat history
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = load_chat_history()  # Load from JSON
+    st.session_state.chat_history = load_chat_history()  # Load the last entries from the log
 
 # Sidebar for Chat History
 with st.sidebar:
@@ -103,8 +243,7 @@ with st.sidebar:
     # Button to clear chat history (also clears the log file)
     if st.button("🗑️ Clear Chat History"):
         st.session_state.chat_history = []
-        with open(log_file, "w", encoding="utf-8") as file:
-            json.dump([], file)  # Reset log file
+        interaction_log.clear()  # Reset log files
         st.rerun()
 
 # Title and Description
@@ -117,33 +256,70 @@ query = st.text_input("🔍 Enter your medical question:", placeholder="E.g., Wh
 # Process Query
 if st.button("🔎 Get Answer"):
     if query.strip():
-        with st.spinner("Fetching the best answer..."):
-            # Generate query embedding
-            query_embedding = embedding_model.encode(query).tolist()
-
-            # Retrieve relevant chunks
-            results = collection.query(query_embeddings=[query_embedding], n_results=5)
-            retrieved_chunk_ids = results.get("ids", [[]])[0]  # Ensure list format
-            retrieved_contents = [get_chunk_content(chunk_id) for chunk_id in retrieved_chunk_ids if chunk_id]
-
-            # Filter out None values
-            retrieved_contents = [content for content in retrieved_contents if content]
-            context = "\n".join(retrieved_contents) if retrieved_contents else "No relevant data found."
-
-            # Generate response using Gemini 2.0
-            if retrieved_contents:
-                model = genai.GenerativeModel("gemini-2.0-flash")
-                response = model.generate_content(f"Context: {context}\nQuestion: {query}\nAnswer:")
-                answer = response.text if response else "Failed to generate an answer."
-            else:
-                answer = "No relevant data found in the context."
+        request_start = time.perf_counter()
+        trace = metrics.start()
+        st.subheader("📌 Answer:")
+        answer_placeholder = st.empty()
+
+        with st.spinner("Fetching the best answer..."), metrics.profile(profile_requests):
+            # Embed, retrieve, check the answer cache and assemble the prompt (batched with concurrent sessions)
+            prepared = engine.prepare(query, trace)
+            streamed = stream_answers and prepared["prompt"] is not None
+
+            # Generate the response with the LLM client, rendering partial output as it arrives
+            render = (lambda text: answer_placeholder.markdown(f"**{text}**", unsafe_allow_html=True)) if streamed else None
+            generate_start = time.perf_counter()
+            answer, first_token = engine.generate(prepared, render, trace)
+            first_token += generate_start - request_start
+            total_latency = time.perf_counter() - request_start
+            if not streamed:
+                first_token = total_latency  # Nothing was streamed: the whole answer arrives at once
+            metrics.observe(trace)
 
             # Log Interaction & Store Chat
-            log_interaction(query, context, answer)
+            log_interaction(query, prepared["context"], answer, {
+                "time_to_first_token": round(first_token, 4),
+                "total_latency": round(total_latency, 4),
+                "streamed": streamed,
+                "prompt_tokens": prepared["prompt_tokens"],
+                "retrieval_timings": {stage: round(seconds, 4) for stage, seconds in prepared["retrieval_timings"].items()},
+            })
 
             # Display Answer
-            st.subheader("📌 Answer:")
-            st.markdown(f"**{answer}**", unsafe_allow_html=True)
+            answer_placeholder.markdown(f"**{answer}**", unsafe_allow_html=True)
 
     else:
         st.warning("⚠️ Please enter a valid medical question.")
+
+# Admin view: rolling per-stage latency percentiles for this process
+with st.sidebar:
+    with st.expander("📈 Request metrics"):
+        stage_stats = metrics.stage_percentiles()
+        if stage_stats:
+            st.write(f"Last {stage_stats['total']['count']} of {metrics.requests} requests")
+            st.table([
+                {
+                    "stage": stage,
+                    "p50 ms": round(values["p50"] * 1000, 1),
+                    "p95 ms": round(values["p95"] * 1000, 1),
+                    "p99 ms": round(values["p99"] * 1000, 1),
+                    "n": values["count"],
+                }
+                for stage, values in sorted(stage_stats.items())
+            ])
+            st.write(metrics.counter_totals)
+        else:
+            st.write("No requests yet.")
+
+# Cold-start vs warm-rerun timing report
+run_seconds = time.perf_counter() - script_start
+timings["runs"].append(run_seconds)
+with st.sidebar:
+    with st.expander("⏱️ Startup timings"):
+        st.write(f"**Cold start (first run):** {timings['runs'][0] * 1000:.0f} ms")
+        st.write(f"**This run:** {run_seconds * 1000:.0f} ms")
+        if len(timings["runs"]) > 1:
+            warm = sorted(timings["runs"][1:])
+            st.write(f"**Median warm rerun:** {warm[len(warm) // 2] * 1000:.0f} ms over {len(warm)} reruns")
+        for name, seconds in timings["loads"].items():
+            st.write(f"{name}: loaded in {seconds * 1000:.0f} ms")
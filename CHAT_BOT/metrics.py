@@ -0,0 +1,178 @@
+import os
+import time
+import datetime
+import threading
+from collections import deque
+from contextlib import contextmanager
+from interaction_log import InteractionLog
+
+
+def percentile(values, pct):
+    """Linearly interpolated percentile of a list of numbers (0.0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100.0
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class Trace:
+    """Timed spans and counters for one request."""
+
+    def __init__(self, name="rag_query"):
+        self.name = name
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+        self.total = None
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(stage, time.perf_counter() - start)
+
+    def add_span(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def count(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def finish(self):
+        if self.total is None:
+            self.total = time.perf_counter() - self._start
+        return self
+
+    def record(self):
+        return {
+            "timestamp": datetime.datetime.fromtimestamp(self.started).strftime("%Y-%m-%d %H:%M:%S"),
+            "name": self.name,
+            "total_seconds": round(self.total or 0.0, 6),
+            "spans": {stage: round(seconds, 6) for stage, seconds in self.spans.items()},
+            "counters": dict(self.counters),
+        }
+
+
+class MetricsRecorder:
+    """Collects finished traces: per-request JSONL records, rolling percentiles and Prometheus text.
+
+    Records go to <log dir>/rag_metrics.jsonl (same append-only writer as the interaction log);
+    the Prometheus exposition is rewritten to prom_file every prom_interval seconds. With
+    profile_dir set, profile() wraps a request in pyinstrument (if installed) or cProfile.
+    """
+
+    def __init__(self, records_file=None, prom_file=None, window=500, prom_interval=10.0, profile_dir=None):
+        self.window = window
+        self.prom_file = prom_file
+        self.prom_interval = prom_interval
+        self.profile_dir = profile_dir
+        self.requests = 0
+        self.counter_totals = {}
+        self.stage_totals = {}
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._last_prom = 0.0
+        self._log = InteractionLog(records_file) if records_file else None
+
+    def start(self, name="rag_query"):
+        return Trace(name)
+
+    def observe(self, trace):
+        trace.finish()
+        with self._lock:
+            self.requests += 1
+            self._recent.append(trace)
+            for counter, value in trace.counters.items():
+                self.counter_totals[counter] = self.counter_totals.get(counter, 0) + value
+            for stage, seconds in list(trace.spans.items()) + [("total", trace.total)]:
+                count, total = self.stage_totals.get(stage, (0, 0.0))
+                self.stage_totals[stage] = (count + 1, total + seconds)
+        if self._log:
+            self._log.append(trace.record())
+        if self.prom_file and time.monotonic() - self._last_prom >= self.prom_interval:
+            self.write_prometheus()
+
+    def stage_percentiles(self, percentiles=(50, 95, 99)):
+        """{stage: {"count": n, "p50": seconds, ...}} over the last `window` requests."""
+        with self._lock:
+            recent = list(self._recent)
+        samples = {}
+        for trace in recent:
+            for stage, seconds in trace.spans.items():
+                samples.setdefault(stage, []).append(seconds)
+            samples.setdefault("total", []).append(trace.total)
+        return {
+            stage: dict({"count": len(values)}, **{f"p{p}": percentile(values, p) for p in percentiles})
+            for stage, values in samples.items()
+        }
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP rag_requests_total Completed RAG requests.",
+            "# TYPE rag_requests_total counter",
+            f"rag_requests_total {self.requests}",
+            "# HELP rag_events_total Request counters (cache hits, retrieved chunks, prompt tokens, ...).",
+            "# TYPE rag_events_total counter",
+        ]
+        with self._lock:
+            counters = dict(self.counter_totals)
+            stage_totals = dict(self.stage_totals)
+        for counter, value in sorted(counters.items()):
+            lines.append(f'rag_events_total{{event="{counter}"}} {value}')
+
+        lines += [
+            "# HELP rag_stage_seconds Per-stage latency over the recent window.",
+            "# TYPE rag_stage_seconds summary",
+        ]
+        for stage, values in sorted(self.stage_percentiles().items()):
+            for p in (50, 95, 99):
+                lines.append(f'rag_stage_seconds{{stage="{stage}",quantile="{p / 100}"}} {values[f"p{p}"]:.6f}')
+            count, total = stage_totals.get(stage, (0, 0.0))
+            lines.append(f'rag_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'rag_stage_seconds_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        path = path or self.prom_file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        self._last_prom = time.monotonic()
+
+    @contextmanager
+    def profile(self, enabled=True):
+        """Profile the wrapped block and save the report to profile_dir (no-op when disabled)."""
+        if not (enabled and self.profile_dir):
+            yield
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+
+        if Profiler:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(os.path.join(self.profile_dir, f"request-{stamp}.html"), "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(os.path.join(self.profile_dir, f"request-{stamp}.prof"))
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+# Exported encoders live in <onnx_dir>/<model name with "/" -> "_">/
+onnx_dir = "/home/shtlp_0042/Desktop/RAG/onnx_models"
+minilm_models = [
+    "sentence-transformers/all-MiniLM-L6-v2",
+    "sentence-transformers/all-MiniLM-L12-v2",
+    "sentence-transformers/all-MiniLM-L6-v1",
+]
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+MODEL_FILES = {"onnx": "model.onnx", "onnx-int8": "model-int8.onnx"}
+
+# Minimum cosine similarity to the PyTorch embedding for an exported model to be accepted
+parity_tolerance = 0.99
+parity_sentences = [
+    "What are the symptoms of asthma?",
+    "How is type 2 diabetes diagnosed?",
+    "Can a migraine cause vision problems or numbness on one side of the body?",
+    "What treatments are available for chronic kidney disease in older adults with high blood pressure?",
+    "Is psoriasis contagious?",
+    "Causes of iron deficiency anemia",
+    "When should I see a doctor about a persistent cough that lasts more than three weeks and gets worse at night?",
+    "Rest",
+]
+
+
+def model_dir(model_name, base_dir=onnx_dir):
+    return os.path.join(base_dir, model_name.replace("/", "_"))
+
+
+class OnnxEncoder:
+    """MiniLM sentence encoder on ONNX Runtime with the same encode() call as SentenceTransformer.
+
+    Needs only onnxruntime and tokenizers at query time (no torch import). Mean pooling and the
+    final L2 normalization are done in NumPy, matching the sentence-transformers pipeline.
+    """
+
+    def __init__(self, path, quantized=False, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.model_name = self.meta["model_name"]
+        self.normalize = self.meta["normalize"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.meta["max_length"])
+        self.tokenizer.enable_padding(pad_id=self.meta["pad_id"], pad_token=self.meta["pad_token"])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = MODEL_FILES["onnx-int8" if quantized else "onnx"]
+        self.session = ort.InferenceSession(os.path.join(path, model_file), options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self):
+        return self.meta["dimension"]
+
+    def _encode_batch(self, sentences):
+        encodings = self.tokenizer.encode_batch(sentences)
+        features = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: features[name] for name in self.input_names})[0]
+        mask = features["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True, **kwargs):
+        """Embed one sentence (returns a vector) or a list (returns an (n, dimension) array).
+
+        Sentences are sorted by length before batching so each batch pads as little as possible.
+        """
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        if not sentences:
+            return np.zeros((0, self.meta["dimension"]), dtype=np.float32)
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        embeddings = np.empty((len(sentences), self.meta["dimension"]), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            rows = order[start : start + batch_size]
+            embeddings[rows] = self._encode_batch([sentences[row] for row in rows])
+        return embeddings[0] if single else embeddings
+
+
+def cosine_parity(reference, candidate):
+    """Row-wise cosine similarity between two embedding matrices: (min, mean)."""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    similarity = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return float(similarity.min()), float(similarity.mean())
+
+
+def load_encoder(model_name, backend="torch", base_dir=onnx_dir, threads=None):
+    """Query encoder for model_name: "torch" (SentenceTransformer), "onnx" or "onnx-int8" (exported by this module)."""
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r} (expected one of {', '.join(ENCODER_BACKENDS)})")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name, device="cpu")
+    return OnnxEncoder(model_dir(model_name, base_dir), quantized=backend == "onnx-int8", threads=threads)
+
+
+def cache_model_name(model_name, backend="torch"):
+    """Key for the query embedding cache: int8 vectors differ slightly, so they don't share torch entries."""
+    return model_name if backend != "onnx-int8" else f"{model_name}#onnx-int8"
+
+
+def export_model(model_name, base_dir=onnx_dir, quantize=True, opset=14, tolerance=parity_tolerance):
+    """Export a sentence-transformers MiniLM to ONNX (plus a dynamically int8-quantized copy) and check parity.
+
+    Raises ValueError if any exported variant falls below `tolerance` cosine similarity to PyTorch.
+    Returns the meta dict written next to the models.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    path = model_dir(model_name, base_dir)
+    os.makedirs(path, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = model[0], model[1]
+    if not getattr(pooling, "pooling_mode_mean_tokens", False):
+        raise ValueError(f"{model_name}: only mean pooling is supported")
+
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(path)  # tokenizer.json is all the runtime needs
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    start = time.perf_counter()
+    axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer.auto_model.eval()), tuple(sample[name] for name in input_names),
+            os.path.join(path, MODEL_FILES["onnx"]), input_names=input_names,
+            output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=opset,
+        )
+    meta = {
+        "model_name": model_name,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_length": model.max_seq_length,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token,
+        "opset": opset,
+        "export_seconds": time.perf_counter() - start,
+        "parity": {},
+    }
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=4)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(os.path.join(path, MODEL_FILES["onnx"]), os.path.join(path, MODEL_FILES["onnx-int8"]),
+                         weight_type=QuantType.QInt8)
+
+    reference = model.encode(parity_sentences, show_progress_bar=False)
+    for backend in ("onnx", "onnx-int8") if quantize else ("onnx",):
+        minimum, mean = cosine_parity(reference, OnnxEncoder(path, quantized=backend == "onnx-int8").encode(parity_sentences))
+        meta["parity"][backend] = {"min_cosine": minimum, "mean_cosine": mean}
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=4)
+
+    failed = [backend for backend, parity in meta["parity"].items() if parity["min_cosine"] < tolerance]
+    if failed:
+        raise ValueError(f"{model_name}: {', '.join(failed)} below cosine parity {tolerance} ({meta['parity']})")
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export MiniLM query encoders to ONNX Runtime (fp32 + dynamic int8).")
+    parser.add_argument("--models", nargs="+", default=minilm_models)
+    parser.add_argument("--output-dir", default=onnx_dir)
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 copy")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--tolerance", type=float, default=parity_tolerance,
+                        help="Minimum cosine similarity to the PyTorch embeddings")
+    args = parser.parse_args()
+
+    for model_name in args.models:
+        meta = export_model(model_name, args.output_dir, not args.no_quantize, args.opset, args.tolerance)
+        parity = ", ".join(f"{backend} min cos {values['min_cosine']:.4f}" for backend, values in meta["parity"].items())
+        print(f"Exported {model_name} to {model_dir(model_name, args.output_dir)} ({parity})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import json
+import mmap
+import struct
+import filecmp
+
+CORPUS_NAME = "corpus.jsonl"
+INDEX_NAME = "corpus.idx"
+# Index record: 40-char hex chunk ID, byte offset and length of its line in the corpus; sorted by ID
+RECORD = struct.Struct("<40sQI")
+
+
+def write_corpus(chunks, folder):
+    """Stream chunk dicts into folder/corpus.jsonl (one compact JSON object per line) plus corpus.idx.
+
+    Both files are written to temporary names and swapped in; if the new corpus is byte-identical
+    to the existing one, the old files are kept untouched (so their mtimes do not change).
+    Returns (number of chunks, whether the corpus changed).
+    """
+    corpus_path = os.path.join(folder, CORPUS_NAME)
+    index_path = os.path.join(folder, INDEX_NAME)
+    records = []
+    offset = 0
+    with open(corpus_path + ".tmp", "wb") as out:
+        for chunk in chunks:
+            line = (json.dumps(chunk, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+            records.append((chunk["chunk_id"].encode("ascii"), offset, len(line)))
+            out.write(line)
+            offset += len(line)
+
+    records.sort()
+    with open(index_path + ".tmp", "wb") as out:
+        for record in records:
+            out.write(RECORD.pack(*record))
+
+    if (os.path.exists(corpus_path) and os.path.exists(index_path)
+            and filecmp.cmp(corpus_path + ".tmp", corpus_path, shallow=False)):
+        os.remove(corpus_path + ".tmp")
+        os.remove(index_path + ".tmp")
+        return len(records), False
+    os.replace(corpus_path + ".tmp", corpus_path)
+    os.replace(index_path + ".tmp", index_path)
+    return len(records), True
+
+
+class PackedCorpus:
+    """Random access into corpus.jsonl through the memory-mapped corpus.idx (binary search by chunk ID)."""
+
+    def __init__(self, folder):
+        self._corpus_file = open(os.path.join(folder, CORPUS_NAME), "rb")
+        self._index_file = open(os.path.join(folder, INDEX_NAME), "rb")
+        self._corpus = self._map(self._corpus_file)
+        self._index = self._map(self._index_file)
+        self._count = len(self._index) // RECORD.size if self._index else 0
+
+    @staticmethod
+    def _map(f):
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, position):
+        return RECORD.unpack_from(self._index, position * RECORD.size)
+
+    def _find(self, chunk_id):
+        key = chunk_id.encode("ascii")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count:
+            found, offset, length = self._record(low)
+            if found == key:
+                return offset, length
+        return None
+
+    def __contains__(self, chunk_id):
+        return self._find(chunk_id) is not None
+
+    def get(self, chunk_id):
+        location = self._find(chunk_id)
+        if location is None:
+            return None
+        offset, length = location
+        try:
+            chunk = json.loads(self._corpus[offset : offset + length])
+        except ValueError:  # Index and corpus from different writes (caught mid-replace)
+            return None
+        return chunk if chunk.get("chunk_id") == chunk_id else None
+
+    def __iter__(self):
+        """Chunks in corpus (ingestion) order."""
+        position = 0
+        while position < len(self._corpus):
+            end = self._corpus.find(b"\n", position)
+            end = len(self._corpus) if end == -1 else end
+            line = self._corpus[position:end]
+            if line.strip():
+                yield json.loads(line)
+            position = end + 1
+
+    def close(self):
+        for mapped in (self._corpus, self._index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        self._corpus_file.close()
+        self._index_file.close()
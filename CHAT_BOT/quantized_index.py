@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+
+FORMAT_VERSION = 1
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def normalize(vectors):
+    """Unit-length float32 rows (cosine ranking == Chroma's default L2 ranking on unit vectors)."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 codes and the float32 scale that maps them back."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.round(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors):
+    """One sign bit per dimension, packed 8 per byte."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _nearest(vectors, centroids, block_size=16384):
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        assign[start : start + block_size] = np.argmax(vectors[start : start + block_size] @ centroids.T, axis=1)
+    return assign
+
+
+def train_ivf(vectors, n_lists, iterations=15, seed=0):
+    """Spherical k-means. Returns (centroids, list assignment per row)."""
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, min(n_lists, len(vectors)))
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        filled = np.bincount(assign, minlength=n_lists) > 0
+        centroids[filled] = normalize(sums[filled])  # Empty lists keep their old centroid
+    return centroids, _nearest(vectors, centroids)
+
+
+def _save(path, array):
+    np.save(path, np.ascontiguousarray(array))
+
+
+def write_index(out_dir, ids, vectors, diseases, quantization="int8", ivf_lists=0, keep_float=True, name=""):
+    """Write a quantized index directory (replaced atomically).
+
+    Files are plain .npy arrays so QuantizedVectorIndex can mmap them: codes (int8 + per-row scale,
+    or packed sign bits), optional float32 vectors for re-scoring, chunk IDs, disease codes and,
+    with ivf_lists > 0, the IVF centroids plus rows grouped by list.
+    """
+    if quantization not in ("int8", "binary"):
+        raise ValueError(f"Unknown quantization: {quantization}")
+    vectors = normalize(vectors) if len(vectors) else np.zeros((0, 0), dtype=np.float32)
+    tmp_dir = out_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    if quantization == "int8":
+        codes, scales = quantize_int8(vectors)
+        _save(os.path.join(tmp_dir, "scales.npy"), scales)
+    else:
+        codes = quantize_binary(vectors)
+    _save(os.path.join(tmp_dir, "codes.npy"), codes)
+    if keep_float:
+        _save(os.path.join(tmp_dir, "vectors.npy"), vectors)
+    _save(os.path.join(tmp_dir, "ids.npy"), np.asarray(list(ids), dtype=str))
+
+    disease_names = sorted({disease for disease in diseases if disease})
+    code_of = {disease: i for i, disease in enumerate(disease_names)}
+    _save(os.path.join(tmp_dir, "diseases.npy"), np.array([code_of.get(d, -1) for d in diseases], dtype=np.int32))
+
+    if ivf_lists and len(vectors):
+        centroids, assign = train_ivf(vectors, ivf_lists)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))]).astype(np.int64)
+        _save(os.path.join(tmp_dir, "ivf_centroids.npy"), centroids)
+        _save(os.path.join(tmp_dir, "ivf_order.npy"), order)
+        _save(os.path.join(tmp_dir, "ivf_offsets.npy"), offsets)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "name": name,
+        "count": int(len(vectors)),
+        "dimension": int(vectors.shape[1]) if len(vectors) else 0,
+        "quantization": quantization,
+        "ivf_lists": int(ivf_lists and len(vectors) and min(ivf_lists, len(vectors))),
+        "float_vectors": keep_float,
+        "diseases": disease_names,
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=4)
+
+    old_dir = out_dir.rstrip("/") + ".old"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return meta
+
+
+def read_collection(collection, page_size=5000):
+    """(ids, float32 vectors, disease per row) of a Chroma collection, read page by page."""
+    ids, embeddings, diseases = [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        ids.extend(page["ids"])
+        embeddings.extend(page["embeddings"])
+        diseases.extend((metadata or {}).get("disease") for metadata in page["metadatas"])
+        offset += len(page["ids"])
+    return ids, np.asarray(embeddings, dtype=np.float32), diseases
+
+
+def export_collection(collection, out_dir, **kwargs):
+    """Copy the vectors of a Chroma collection into a quantized index (no re-encoding)."""
+    ids, vectors, diseases = read_collection(collection)
+    return write_index(out_dir, ids, vectors, diseases, name=kwargs.pop("name", collection.name), **kwargs)
+
+
+class QuantizedVectorIndex:
+    """Memory-mapped int8/binary vector index answering the Chroma query() calls Retriever makes.
+
+    Candidates are scored on the quantized codes (all rows, or the nprobe closest IVF lists when
+    the index has them and no disease filter applies); with float vectors on disk and rescore on,
+    the best rescore_candidates are re-scored exactly. Nothing is deserialized at startup: every
+    array is opened with mmap and only the pages a query touches are read.
+    """
+
+    def __init__(self, path, rescore=True, rescore_candidates=100, nprobe=8, block_size=65536):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.name = self.meta["name"]
+        self.quantization = self.meta["quantization"]
+        self.dimension = self.meta["dimension"]
+        self.rescore = rescore
+        self.rescore_candidates = rescore_candidates
+        self.nprobe = nprobe
+        self.block_size = block_size
+        self._codes = self._load("codes.npy")
+        self._scales = self._load("scales.npy") if self.quantization == "int8" else None
+        self._vectors = self._load("vectors.npy") if self.meta["float_vectors"] else None
+        self._ids = self._load("ids.npy")
+        self._diseases = self._load("diseases.npy")
+        self._disease_codes = {disease: i for i, disease in enumerate(self.meta["diseases"])}
+        self._ivf = None
+        if self.meta["ivf_lists"]:
+            self._ivf = (self._load("ivf_centroids.npy"), self._load("ivf_order.npy"), self._load("ivf_offsets.npy"))
+
+    def _load(self, file_name):
+        return np.load(os.path.join(self.path, file_name), mmap_mode="r")
+
+    def count(self):
+        return self.meta["count"]
+
+    def disk_bytes(self):
+        return {
+            file_name: os.path.getsize(os.path.join(self.path, file_name))
+            for file_name in sorted(os.listdir(self.path))
+        }
+
+    def _filter_rows(self, where):
+        """Row indices allowed by a Retriever.where_filter() dict, or None for no filter."""
+        if not where:
+            return None
+        wanted = where.get("disease")
+        names = wanted.get("$in", []) if isinstance(wanted, dict) else [wanted]
+        codes = [self._disease_codes[name] for name in names if name in self._disease_codes]
+        return np.flatnonzero(np.isin(self._diseases, codes))
+
+    def _coarse_scores(self, queries, rows):
+        """Approximate cosine of every query against rows (a slice or sorted index array)."""
+        codes = self._codes[rows]
+        if self.quantization == "int8":
+            return (queries @ codes.astype(np.float32).T) * self._scales[rows]
+        bits = quantize_binary(queries)
+        if hasattr(np, "bitwise_count") and codes.shape[1] % 8 == 0:  # NumPy >= 2.0: popcount on 64-bit words
+            codes, bits = codes.view(np.uint64), bits.view(np.uint64)
+            hamming = np.stack([np.bitwise_count(codes ^ b).sum(axis=1, dtype=np.int32) for b in bits])
+        else:
+            hamming = np.stack([_POPCOUNT[np.bitwise_xor(codes, b)].sum(axis=1, dtype=np.int32) for b in bits])
+        return 1.0 - 2.0 * hamming / self.dimension
+
+    def _top(self, queries, rows, fetch):
+        """Best `fetch` rows per query over rows (None = every row), scanned in blocks."""
+        total = self.count() if rows is None else len(rows)
+        best = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+        for start in range(0, total, self.block_size):
+            stop = min(start + self.block_size, total)
+            block = slice(start, stop) if rows is None else rows[start:stop]
+            block_rows = np.arange(start, stop) if rows is None else block
+            scores = self._coarse_scores(queries, block)
+            for i, (kept_rows, kept_scores) in enumerate(best):
+                candidate_rows = np.concatenate([kept_rows, block_rows])
+                candidate_scores = np.concatenate([kept_scores, scores[i]])
+                if len(candidate_scores) > fetch:
+                    keep = np.argpartition(-candidate_scores, fetch - 1)[:fetch]
+                    candidate_rows, candidate_scores = candidate_rows[keep], candidate_scores[keep]
+                best[i] = (candidate_rows, candidate_scores)
+        return best
+
+    def _probe(self, query):
+        centroids, order, offsets = self._ivf
+        lists = np.argsort(-(centroids @ query))[: self.nprobe]
+        return np.sort(np.concatenate([order[offsets[l] : offsets[l + 1]] for l in lists]))
+
+    def search(self, query_embeddings, k=10, where=None):
+        """[(row indices, cosine scores)] per query, best first."""
+        queries = normalize(query_embeddings)
+        rescore = self.rescore and self._vectors is not None
+        fetch = max(k, self.rescore_candidates) if rescore else k
+        allowed = self._filter_rows(where)
+        if allowed is not None:
+            candidates = self._top(queries, allowed, fetch) if len(allowed) else [(np.empty(0, np.int64), np.empty(0))] * len(queries)
+        elif self._ivf is not None:
+            candidates = [self._top(query[None, :], self._probe(query), fetch)[0] for query in queries]
+        else:
+            candidates = self._top(queries, None, fetch)
+
+        results = []
+        for query, (rows, scores) in zip(queries, candidates):
+            if rescore and len(rows):
+                rows = np.sort(rows)  # Sequential reads from the mmap
+                scores = self._vectors[rows] @ query
+            order = np.argsort(-scores, kind="stable")[:k]
+            results.append((rows[order], scores[order]))
+        return results
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        """Chroma-compatible subset: ids and L2 distances between unit vectors (documents come from the ChunkStore)."""
+        results = self.search(query_embeddings, n_results, where)
+        return {
+            "ids": [[str(self._ids[row]) for row in rows] for rows, _ in results],
+            "distances": [[float(2.0 - 2.0 * score) for score in scores] for _, scores in results],
+            "documents": None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Chroma collections into memory-mapped quantized indexes.")
+    parser.add_argument("--chroma-path", default="/home/shtlp_0042/Desktop/RAG/chroma_db")
+    parser.add_argument("--out-dir", default="/home/shtlp_0042/Desktop/RAG/quantized_index")
+    parser.add_argument("--collections", nargs="+", default=[
+        "sentence-transformers_all-MiniLM-L6-v2",
+        "sentence-transformers_all-MiniLM-L12-v2",
+        "sentence-transformers_all-MiniLM-L6-v1",
+    ])
+    parser.add_argument("--quantization", choices=["int8", "binary"], default="int8")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="0 = brute force; ~sqrt(N) is a good start")
+    parser.add_argument("--no-float", action="store_true", help="Skip the float32 copy used for exact re-scoring")
+    args = parser.parse_args()
+
+    import chromadb
+    chroma_client = chromadb.PersistentClient(path=args.chroma_path)
+    for name in args.collections:
+        start = time.perf_counter()
+        meta = export_collection(
+            chroma_client.get_collection(name=name), os.path.join(args.out_dir, name),
+            quantization=args.quantization, ivf_lists=args.ivf_lists, keep_float=not args.no_float,
+        )
+        print(f"{name}: {meta['count']} vectors -> {args.quantization} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
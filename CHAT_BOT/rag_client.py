@@ -0,0 +1,33 @@
+import json
+import urllib.request
+
+
+class RAGClient:
+    """Minimal HTTP client for rag_service.py (standard library only)."""
+
+    def __init__(self, base_url="http://127.0.0.1:8000", timeout=120.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data, headers={"Content-Type": "application/json"},
+            method="POST" if data is not None else "GET",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def health(self):
+        return self._request("/health")
+
+    def query(self, question, collections=None):
+        """Full answer from the service: answer, context, chunk_ids, cached, trace.
+
+        collections: ensemble collection names for this request (None = the service default).
+        """
+        return self._request("/query", {"question": question, "collections": collections})
+
+    def retrieve(self, question, collections=None):
+        """Retrieval and context only (no LLM call): context, chunk_ids, prompt, cached_answer."""
+        return self._request("/query", {"question": question, "generate": False, "collections": collections})
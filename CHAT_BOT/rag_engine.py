@@ -0,0 +1,264 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from context_builder import build_context, count_tokens
+
+NO_CONTEXT_ANSWER = "No relevant data found in the context."
+FAILED_ANSWER = "Failed to generate an answer."
+
+
+def build_prompt(context, question):
+    return f"Context: {context}\nQuestion: {question}\nAnswer:"
+
+
+class MicroBatcher:
+    """Groups items submitted concurrently within `window` seconds into one batch_fn call.
+
+    batch_fn(items) must return one result per item. submit() blocks until its result is ready.
+    """
+
+    def __init__(self, batch_fn, window=0.005, max_batch=32):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.batches += 1
+            self.items += len(pending)
+            try:
+                results = self.batch_fn([item for item, _ in pending])
+                for (_, future), result in zip(pending, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+class RAGEngine:
+    """retrieve -> assemble -> generate, shared by the Streamlit app, the test runner and the HTTP service.
+
+    prepare() embeds the question, retrieves, checks the semantic answer cache against the
+    retrieved chunk set and builds the prompt; concurrent prepare() calls are micro-batched
+    into one encode_many and one retrieve_many call. generate() runs the LLM (optionally
+    streaming) and fills the answer cache.
+    """
+
+    def __init__(self, query_encoder, retriever, llm, answer_cache=None, metrics=None,
+                 n_results=5, context_token_budget=1500, batch_window=0.005, max_batch=32):
+        """llm: an llm_client.LLMClient (anything with generate(prompt) and stream(prompt)),
+        or a zero-argument callable returning one (loaded on the first LLM call).
+        """
+        self.query_encoder = query_encoder
+        self.retriever = retriever
+        self._llm = llm
+        self.answer_cache = answer_cache
+        self.metrics = metrics
+        self.n_results = n_results
+        self.context_token_budget = context_token_budget
+        self._batcher = MicroBatcher(self._prepare_batch, batch_window, max_batch) if batch_window else None
+
+    @property
+    def llm(self):
+        if not hasattr(self._llm, "stream"):
+            self._llm = self._llm()
+        return self._llm
+
+    def llm_stats(self):
+        """LLM client stats without loading the client ({} until the first LLM call)."""
+        return self._llm.stats() if hasattr(self._llm, "stream") else {}
+
+    @property
+    def batch_stats(self):
+        if not self._batcher:
+            return {"batches": 0, "items": 0, "mean_batch": 0.0}
+        batches, items = self._batcher.batches, self._batcher.items
+        return {"batches": batches, "items": items, "mean_batch": items / batches if batches else 0.0}
+
+    def _prepare_batch(self, requests):
+        queries = [query for query, _, _ in requests]
+        traces = [trace for _, trace, _ in requests]
+        collections = [names for _, _, names in requests]
+        return self.prepare_many(queries, traces, collections)
+
+    def prepare(self, query, trace=None, collections=None):
+        """collections: ensemble collection names for this question (None = the retriever's default)."""
+        if self._batcher:
+            return self._batcher.submit((query, trace, collections))
+        return self.prepare_many([query], [trace], [collections])[0]
+
+    def prepare_many(self, queries, traces=None, collections=None):
+        """Everything up to the LLM call for a batch of questions. Returns one dict per question.
+
+        collections: one list of ensemble collection names (or None) per question; questions
+        sharing a selection share one retrieve_many call.
+        """
+        traces = traces or [None] * len(queries)
+        collections = collections or [None] * len(queries)
+
+        known = [self.query_encoder.is_cached(query) for query in queries]
+        start = time.perf_counter()
+        embeddings = self.query_encoder.encode_many(queries)
+        encode_seconds = time.perf_counter() - start
+
+        prepared = []
+        for query, embedding, trace, hit in zip(queries, embeddings, traces, known):
+            item = {
+                "query": query, "embedding": embedding, "cached": None, "chunk_ids": [],
+                "contents": [], "context": "", "prompt": None, "prompt_tokens": 0,
+                "retrieval_timings": {}, "diseases": [],
+            }
+            if trace:
+                trace.add_span("encode", encode_seconds)
+                trace.count("query_cache_hit", int(hit))
+            prepared.append(item)
+
+        groups = {}
+        for i, names in enumerate(collections):
+            groups.setdefault(None if names is None else tuple(names), []).append(i)
+        for names, pending in groups.items():
+            start = time.perf_counter()
+            retrievals = self.retriever.retrieve_many(
+                [queries[i] for i in pending], self.n_results, [embeddings[i] for i in pending],
+                collections=None if names is None else list(names),
+            )
+            retrieve_seconds = time.perf_counter() - start
+            for i, retrieval in zip(pending, retrievals):
+                item, trace = prepared[i], traces[i]
+                item["chunk_ids"] = retrieval["ids"]
+                item["contents"] = retrieval["contents"]
+                item["diseases"] = retrieval.get("diseases", [])
+                item["retrieval_timings"] = retrieval["timings"]
+                if trace:
+                    trace.add_span("retrieve", retrieve_seconds)
+                    for stage, seconds in retrieval["timings"].items():
+                        trace.add_span(f"retrieve.{stage}", seconds)
+                    trace.count("retrieved_chunks", len(retrieval["ids"]))
+
+                # Only reuse an answer generated from exactly the chunks retrieved now
+                if self.answer_cache and retrieval["ids"]:
+                    start = time.perf_counter()
+                    item["cached"] = self.answer_cache.lookup(item["embedding"], chunk_ids=retrieval["ids"])
+                    if trace:
+                        trace.add_span("answer_cache", time.perf_counter() - start)
+                        trace.count("answer_cache_hit", int(bool(item["cached"])))
+                if item["cached"]:
+                    item["context"] = item["cached"]["context"]
+                    continue
+
+                start = time.perf_counter()
+                context_info = build_context(retrieval["contents"], retrieval["scores"], self.context_token_budget)
+                context_seconds = time.perf_counter() - start
+                if retrieval["contents"]:
+                    item["context"] = context_info["context"]
+                    item["prompt"] = build_prompt(item["context"], item["query"])
+                    item["prompt_tokens"] = count_tokens(item["prompt"])
+                else:
+                    item["context"] = "No relevant data found."
+
+                if trace:
+                    trace.add_span("context", context_seconds)
+                    trace.count("context_tokens", context_info["tokens"])
+                    trace.count("prompt_tokens", item["prompt_tokens"])
+        return prepared
+
+    def generate(self, prepared, on_text=None, trace=None):
+        """Answer a prepared question. With on_text, streams and calls on_text(answer_so_far) per chunk.
+
+        Returns (answer, seconds from the start of generation to the first token).
+        """
+        if prepared["cached"]:
+            return prepared["cached"]["answer"], 0.0
+        if not prepared["prompt"]:
+            return NO_CONTEXT_ANSWER, 0.0
+
+        start = time.perf_counter()
+        first_token = None
+        if on_text:
+            answer = ""
+            for text in self.llm.stream(prepared["prompt"]):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                answer += text
+                on_text(answer)
+        else:
+            answer = self.llm.generate(prepared["prompt"])
+        elapsed = time.perf_counter() - start
+        first_token = elapsed if first_token is None else first_token
+
+        if trace:
+            trace.add_span("generate", elapsed)
+            trace.add_span("generate.first_token", first_token)
+        if not answer:
+            return FAILED_ANSWER, first_token
+        if self.answer_cache:
+            self.answer_cache.store(prepared["query"], prepared["embedding"], prepared["chunk_ids"], answer, prepared["context"])
+        return answer, first_token
+
+    def answer(self, query, on_text=None, collections=None):
+        """Full pipeline for one question; returns answer, context, chunk IDs and the trace record."""
+        trace = self.metrics.start() if self.metrics else None
+        prepared = self.prepare(query, trace, collections)
+        answer, first_token = self.generate(prepared, on_text, trace)
+        if self.metrics:
+            self.metrics.observe(trace)
+        return {
+            "query": query,
+            "answer": answer,
+            "context": prepared["context"],
+            "chunk_ids": prepared["chunk_ids"],
+            "diseases": prepared["diseases"],
+            "cached": bool(prepared["cached"]),
+            "first_token_seconds": first_token,
+            "prompt_tokens": prepared["prompt_tokens"],
+            "trace": trace.record() if trace else None,
+        }
+
+    def answer_many(self, queries, max_workers=8, on_result=None, prepared=None):
+        """Batch-prepare every question, then generate concurrently. on_result(index, result) per answer.
+
+        prepared: already prepared dicts, one per question (e.g. from prepare_many in chunks or
+        from the HTTP service), in which case preparation is skipped.
+        """
+        prepared = self.prepare_many(queries) if prepared is None else prepared
+        results = [None] * len(queries)
+
+        def run(index):
+            try:
+                answer, first_token = self.generate(prepared[index])
+                result = {"query": queries[index], "answer": answer, "context": prepared[index]["context"],
+                          "chunk_ids": prepared[index]["chunk_ids"], "cached": bool(prepared[index]["cached"]),
+                          "first_token_seconds": first_token, "prompt_tokens": prepared[index]["prompt_tokens"],
+                          "error": None}
+            except Exception as e:
+                result = {"query": queries[index], "answer": None, "error": e}
+            results[index] = result
+            if on_result:
+                on_result(index, result)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(run, range(len(queries))))
+        return results
@@ -0,0 +1,189 @@
+import os
+import time
+import argparse
+from chunk_store import ChunkStore
+from embedding_cache import QueryEmbeddingCache
+from answer_cache import SemanticAnswerCache
+from retrieval import Retriever, CollectionSource
+from metrics import MetricsRecorder
+from rag_engine import RAGEngine
+
+# Paths
+chroma_path = "/home/shtlp_0042/Desktop/RAG/chroma_db"
+chunks_folder = "/home/shtlp_0042/Desktop/RAG/processed_data"
+query_cache_file = "/home/shtlp_0042/Desktop/RAG/query_embeddings.sqlite"
+metrics_file = "/home/shtlp_0042/Desktop/RAG/rag_service_metrics.jsonl"
+prometheus_file = "/home/shtlp_0042/Desktop/RAG/rag_service_metrics.prom"
+quantized_index_dir = "/home/shtlp_0042/Desktop/RAG/quantized_index"
+onnx_dir = "/home/shtlp_0042/Desktop/RAG/onnx_models"
+
+# Models
+embedding_model_name = "sentence-transformers/all-MiniLM-L6-v2"
+collection_name = "sentence-transformers_all-MiniLM-L6-v2"
+encoder_backend = "torch"  # or "onnx" / "onnx-int8" (export with onnx_encoder.py first)
+gemini_model_name = "gemini-2.0-flash"
+llm_backend = "gemini"  # or "stub": deterministic offline answers, no network or API key
+stub_latency = 0.5  # Seconds per stub call
+llm_timeout = 30.0
+llm_retries = 3
+
+# Ensemble retrieval: collections (built by embedding_generator.py) that can be queried in parallel,
+# each with its own encoder, and fused with weighted RRF. Requests may pick any subset by name.
+ensemble_models = {  # Model name -> RRF weight; the collection name is the model name with "/" -> "_"
+    "sentence-transformers/all-MiniLM-L6-v2": 1.0,
+    "sentence-transformers/all-MiniLM-L12-v2": 1.0,
+    "sentence-transformers/all-MiniLM-L6-v1": 1.0,
+}
+ensemble_collections = []  # Default selection ([] = collection_name alone), e.g. the best benchmark_retrieval.py combination
+
+# Retrieval and batching
+vector_backend = "chroma"  # or "quantized"
+retrieval_mode = "hybrid"
+retrieval_candidates = 20
+disease_filter = True
+context_token_budget = 1500
+batch_window = 0.005  # Seconds a request waits for others to share its encode and Chroma calls
+max_batch = 32
+
+
+def load_llm_client(backend=None):
+    from llm_client import LLMClient, make_backend
+    backend = backend or llm_backend
+    if backend == "stub":
+        return LLMClient(make_backend("stub", latency=stub_latency), timeout=llm_timeout, retries=llm_retries)
+    return LLMClient(make_backend("gemini", model_name=gemini_model_name, api_key="YOUR_API_KEY"),
+                     timeout=llm_timeout, retries=llm_retries)
+
+
+def build_engine(llm=load_llm_client, use_answer_cache=True, batch_window=batch_window, use_query_cache=True):
+    """Load every warm resource once: chunk store, MiniLM (PyTorch or ONNX), Chroma collection, BM25 and disease matcher.
+
+    use_query_cache=False encodes every question (no in-memory or SQLite query embedding cache).
+    """
+    from onnx_encoder import load_encoder, cache_model_name
+
+    chunk_store = ChunkStore(chunks_folder)
+    chroma_client = None
+    if vector_backend != "quantized":
+        import chromadb
+        chroma_client = chromadb.PersistentClient(path=chroma_path)
+
+    def open_collection(name):
+        if vector_backend == "quantized":
+            from quantized_index import QuantizedVectorIndex
+            return QuantizedVectorIndex(os.path.join(quantized_index_dir, name))
+        return chroma_client.get_or_create_collection(name=name)
+
+    cache_options = {"db_path": query_cache_file} if use_query_cache else {"max_size": 0}
+
+    def make_encoder(model_name):
+        # Ensemble-only models load on their first cache miss
+        return QueryEmbeddingCache(lambda: load_encoder(model_name, encoder_backend, onnx_dir),
+                                   cache_model_name(model_name, encoder_backend), **cache_options)
+
+    collection = open_collection(collection_name)
+    query_encoder = QueryEmbeddingCache(load_encoder(embedding_model_name, encoder_backend, onnx_dir),
+                                        cache_model_name(embedding_model_name, encoder_backend), **cache_options)
+    sources = {}
+    for model_name, weight in ensemble_models.items():
+        name = model_name.replace("/", "_")
+        if name == collection_name:
+            sources[name] = CollectionSource(collection, query_encoder, weight)
+        else:
+            sources[name] = CollectionSource(lambda name=name: open_collection(name), make_encoder(model_name), weight)
+    retriever = Retriever(collection, chunk_store, query_encoder, mode=retrieval_mode,
+                          candidates=retrieval_candidates, disease_filter=disease_filter,
+                          sources=sources, collections=ensemble_collections)
+    retriever.refresh_indexes()
+    for name in ensemble_collections:  # Warm the default ensemble so the first request doesn't load models
+        sources[name].collection
+        sources[name].query_encoder.model
+    answer_cache = None
+    if use_answer_cache:
+        answer_cache = SemanticAnswerCache(threshold=0.92, ttl_seconds=24 * 3600, max_size=1000,
+                                           is_valid=chunk_store.contains_all)
+    metrics = MetricsRecorder(metrics_file, prometheus_file)
+    return RAGEngine(query_encoder, retriever, llm, answer_cache, metrics, n_results=5,
+                     context_token_budget=context_token_budget, batch_window=batch_window, max_batch=max_batch)
+
+
+def create_app(engine=None):
+    """FastAPI app over one shared engine. Handlers are sync, so FastAPI runs them on its thread
+    pool and requests arriving together are micro-batched by the engine."""
+    from fastapi import FastAPI, HTTPException
+    from fastapi.responses import PlainTextResponse
+    from typing import List, Optional
+    from pydantic import BaseModel
+
+    class QueryRequest(BaseModel):
+        question: str
+        generate: bool = True  # False: retrieval and context only, no LLM call
+        collections: Optional[List[str]] = None  # Ensemble collections for this request (None = service default)
+
+    app = FastAPI(title="Medical RAG query service")
+    state = {"engine": engine, "started": time.time()}
+
+    @app.on_event("startup")
+    def warm_up():
+        if state["engine"] is None:
+            state["engine"] = build_engine()
+
+    @app.get("/health")
+    def health():
+        engine = state["engine"]
+        return {
+            "status": "ok" if engine else "loading",
+            "uptime_seconds": round(time.time() - state["started"], 1),
+            "chunks": len(engine.retriever.chunk_store) if engine else 0,
+            "batching": engine.batch_stats if engine else {},
+            "llm": engine.llm_stats() if engine else {},
+            "collections": {"available": sorted(engine.retriever.sources), "default": engine.retriever.collections}
+            if engine else {},
+        }
+
+    @app.post("/query")
+    def query(request: QueryRequest):
+        engine = state["engine"]
+        if not request.question.strip():
+            raise HTTPException(status_code=400, detail="Empty question")
+        unknown = [name for name in request.collections or [] if name not in engine.retriever.sources]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(unknown)}")
+        if not request.generate:
+            prepared = engine.prepare(request.question, collections=request.collections)
+            return {
+                "question": request.question,
+                "context": prepared["context"],
+                "chunk_ids": prepared["chunk_ids"],
+                "diseases": prepared["diseases"],
+                "prompt": prepared["prompt"],
+                "cached_answer": prepared["cached"]["answer"] if prepared["cached"] else None,
+            }
+        result = engine.answer(request.question, collections=request.collections)
+        result["question"] = result.pop("query")
+        return result
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def prometheus():
+        engine = state["engine"]
+        return engine.metrics.prometheus_text() if engine and engine.metrics else ""
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the RAG query path over HTTP from one warm process.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--llm", choices=["gemini", "stub"], default=llm_backend,
+                        help="stub answers offline with fixed latency (load tests, CI)")
+    args = parser.parse_args()
+
+    import uvicorn
+    # One process: the models, Chroma client, LLM client and caches are shared by every client
+    engine = build_engine(lambda: load_llm_client(args.llm))
+    uvicorn.run(create_app(engine), host=args.host, port=args.port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
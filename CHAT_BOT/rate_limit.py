@@ -0,0 +1,84 @@
+import time
+import random
+import threading
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount=1):
+        """Take `amount` tokens (going negative if needed) and return how long to wait before using them."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+    """Blocks callers so requests/min and tokens/min both stay under quota."""
+
+    def __init__(self, requests_per_minute=15, tokens_per_minute=1_000_000):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens=0):
+        wait = self.requests.reserve(1)
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def estimate_tokens(text):
+    """Rough token count for quota accounting (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def is_quota_error(error):
+    """True for 429/quota and transient server errors that are worth retrying."""
+    try:
+        from google.api_core import exceptions as google_exceptions
+        retryable = (
+            google_exceptions.ResourceExhausted,
+            google_exceptions.TooManyRequests,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.InternalServerError,
+        )
+        if isinstance(error, retryable):
+            return True
+    except ImportError:
+        pass
+    message = str(error).lower()
+    return "429" in message or "quota" in message or "rate limit" in message or "503" in message
+
+
+def backoff_delay(attempt, base_delay=2.0, max_delay=60.0):
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def retry_with_backoff(call, retries=5, base_delay=2.0, max_delay=60.0, should_retry=is_quota_error):
+    """Run call(), retrying retryable errors with exponential backoff and full jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == retries or not should_retry(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            print(f"Retryable error ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
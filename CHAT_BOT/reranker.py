@@ -0,0 +1,84 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CrossEncoderReranker:
+    """Re-scores (query, chunk) pairs with a small local cross-encoder.
+
+    Scores are cached per (query hash, chunk ID). Uncached pairs are scored in batches in their
+    original rank order; once latency_budget seconds have passed, the remaining candidates keep
+    their retrieval order behind the re-ranked ones, with scores below the lowest real score.
+    """
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size=32,
+                 latency_budget=None, cache_size=20000):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.latency_budget = latency_budget
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._model = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def _cached(self, key):
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _remember(self, items):
+        with self._lock:
+            for key, score in items:
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(self, query, ids, contents, top_n=5):
+        """Return (ids, contents, scores) of the top_n candidates by cross-encoder score."""
+        start = time.perf_counter()
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        scores = [None] * len(ids)
+        pending = []
+        for index, chunk_id in enumerate(ids):
+            score = self._cached((query_hash, chunk_id))
+            if score is None:
+                pending.append(index)
+            else:
+                scores[index] = score
+        self.hits += len(ids) - len(pending)
+
+        for batch_start in range(0, len(pending), self.batch_size):
+            if self.latency_budget is not None and time.perf_counter() - start > self.latency_budget:
+                break
+            batch = pending[batch_start : batch_start + self.batch_size]
+            values = self.model.predict([(query, contents[i]) for i in batch], batch_size=self.batch_size)
+            self._remember([((query_hash, ids[i]), float(value)) for i, value in zip(batch, values)])
+            for i, value in zip(batch, values):
+                scores[i] = float(value)
+            self.misses += len(batch)
+
+        # Candidates left unscored by the latency budget rank below every scored one, in retrieval
+        # order, with real floats so callers can keep sorting and comparing scores
+        unscored = [i for i in range(len(ids)) if scores[i] is None]
+        if unscored:
+            floor = min((score for score in scores if score is not None), default=0.0)
+            for rank, i in enumerate(unscored, 1):
+                scores[i] = floor - rank
+        order = sorted(range(len(ids)), key=lambda i: (-scores[i], i))[:top_n]
+        return [ids[i] for i in order], [contents[i] for i in order], [scores[i] for i in order]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
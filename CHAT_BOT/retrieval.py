@@ -0,0 +1,303 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from disease_matcher import DiseaseMatcher
+
+
+class CollectionSource:
+    """One dense index for ensemble retrieval: a collection, the encoder of the model that built it and its RRF weight.
+
+    collection may be a zero-argument callable returning the collection (loaded on first use).
+    """
+
+    def __init__(self, collection, query_encoder, weight=1.0):
+        self._collection = collection
+        self.query_encoder = query_encoder
+        self.weight = weight
+
+    @property
+    def collection(self):
+        if not hasattr(self._collection, "query"):
+            self._collection = self._collection()
+        return self._collection
+
+
+class Retriever:
+    """Dense (Chroma), sparse (BM25) or hybrid retrieval over the processed chunks.
+
+    In hybrid mode the Chroma query and the BM25 lookup run concurrently and their rankings are
+    fused with weighted reciprocal-rank fusion. With disease_filter on, a question that names a
+    disease is searched only within that disease's chunks (falling back to the whole corpus when
+    nothing is found there, and blending in a whole-corpus search when the question names several
+    diseases). With a reranker, rerank_candidates fused results are re-scored by
+    the cross-encoder and the best n_results are kept.
+
+    With `collections` (names from `sources`), the dense side is an ensemble: every named
+    collection is encoded and queried concurrently with its own model, and all rankings are fused
+    together, so dense latency is that of the slowest collection rather than the sum.
+    """
+
+    def __init__(self, collection, chunk_store, query_encoder=None, mode="hybrid",
+                 candidates=20, rrf_k=60, dense_weight=1.0, sparse_weight=1.0,
+                 disease_filter=True, max_filter_diseases=10, reranker=None, rerank_candidates=30,
+                 sources=None, collections=None):
+        """collection may be a zero-argument callable returning the collection (loaded on first use).
+
+        sources: {name: CollectionSource} available for ensemble retrieval; collections: the names
+        queried by default (None or [] = `collection` alone). Both can be overridden per call.
+        """
+        self._collection = collection
+        self.chunk_store = chunk_store
+        self.query_encoder = query_encoder
+        self.mode = mode
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.dense_weight = dense_weight
+        self.sparse_weight = sparse_weight
+        self.disease_filter = disease_filter
+        self.max_filter_diseases = max_filter_diseases
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.sources = sources or {}
+        self.collections = list(collections or [])
+        self._bm25 = None
+        self._matcher = None
+        self._disease_ids = {}
+        self._index_version = None
+        self._index_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=4 + len(self.sources), thread_name_prefix="retriever")
+
+    @property
+    def collection(self):
+        if not hasattr(self._collection, "query"):
+            self._collection = self._collection()
+        return self._collection
+
+    def refresh_indexes(self):
+        """Rebuild the BM25 index and the disease matcher when the chunk store changes."""
+        self.chunk_store.refresh()
+        with self._index_lock:
+            if self._index_version == self.chunk_store.version:
+                return
+            chunks = self.chunk_store.all_chunks()
+            disease_ids = {}
+            for chunk in chunks:
+                disease = chunk.get("metadata", {}).get("disease")
+                if disease:
+                    disease_ids.setdefault(disease, set()).add(chunk["chunk_id"])
+            self._bm25 = BM25Index(chunks)
+            self._matcher = DiseaseMatcher(disease_ids)
+            self._disease_ids = disease_ids
+            self._index_version = self.chunk_store.version
+
+    @property
+    def bm25(self):
+        self.refresh_indexes()
+        return self._bm25
+
+    @property
+    def matcher(self):
+        self.refresh_indexes()
+        return self._matcher
+
+    def match_diseases(self, query):
+        """Diseases to restrict the search to, or [] for a global search."""
+        return self._filter_diseases(self.matcher.match(query))
+
+    def _filter_diseases(self, matched):
+        diseases = self.matcher.expand(matched)
+        return diseases if len(diseases) <= self.max_filter_diseases else []
+
+    @staticmethod
+    def where_filter(diseases):
+        if not diseases:
+            return None
+        if len(diseases) == 1:
+            return {"disease": diseases[0]}
+        return {"disease": {"$in": diseases}}
+
+    def _dense(self, embeddings, wheres, n_results, collection=None):
+        """One Chroma query per distinct filter; returns [(chunk_id, document)] rankings in query order."""
+        collection = self.collection if collection is None else collection
+        start = time.perf_counter()
+        groups = {}
+        for index, where in enumerate(wheres):
+            groups.setdefault(json.dumps(where, sort_keys=True), (where, []))[1].append(index)
+
+        rankings = [None] * len(embeddings)
+        for where, indices in groups.values():
+            kwargs = {"where": where} if where else {}
+            results = collection.query(
+                query_embeddings=[embeddings[i] for i in indices], n_results=n_results, **kwargs
+            )
+            for position, index in enumerate(indices):
+                ids = results["ids"][position]
+                documents = (results.get("documents") or [None] * len(indices))[position] or [None] * len(ids)
+                rankings[index] = [(chunk_id, document) for chunk_id, document in zip(ids, documents) if chunk_id]
+        return rankings, time.perf_counter() - start
+
+    def _dense_source(self, source, queries, embeddings, wheres, n_results):
+        """Encode with the source's own model (reusing embeddings from the same encoder) and query its collection."""
+        start = time.perf_counter()
+        if embeddings is None or source.query_encoder is not self.query_encoder:
+            embeddings = source.query_encoder.encode_many(queries)
+        rankings, _ = self._dense(embeddings, wheres, n_results, source.collection)
+        return rankings, time.perf_counter() - start
+
+    def _resolve_sources(self, collections):
+        names = self.collections if collections is None else collections
+        unknown = [name for name in names if name not in self.sources]
+        if unknown:
+            raise ValueError(f"Unknown collections {unknown} (available: {sorted(self.sources)})")
+        return [(name, self.sources[name]) for name in names]
+
+    def _sparse(self, queries, allowed, n_results):
+        start = time.perf_counter()
+        index = self.bm25
+        rankings = [
+            [chunk_id for chunk_id, _ in index.search(query, n_results, allowed_ids)]
+            for query, allowed_ids in zip(queries, allowed)
+        ]
+        return rankings, time.perf_counter() - start
+
+    def retrieve_many(self, queries, n_results=5, query_embeddings=None, mode=None, disease_filter=None, rerank=None,
+                      collections=None):
+        """Retrieve for several queries at once (batched Chroma calls).
+
+        collections: ensemble collection names for this call (None = the retriever's default).
+        Returns one dict per query: ids, contents, scores, the diseases the search was restricted
+        to and the per-stage latency in seconds.
+        """
+        mode = mode or self.mode
+        sources = self._resolve_sources(collections) if mode in ("dense", "hybrid") else []
+        disease_filter = self.disease_filter if disease_filter is None else disease_filter
+        rerank = self.reranker is not None if rerank is None else rerank and self.reranker is not None
+        timings = {}
+        keep = max(n_results, self.rerank_candidates) if rerank else n_results
+        fetch = max(self.candidates, keep) if mode == "hybrid" else keep
+
+        matched = diseases = [[] for _ in queries]
+        if disease_filter:
+            self.refresh_indexes()
+            start = time.perf_counter()
+            matched = [self.matcher.match(query) for query in queries]
+            diseases = [self._filter_diseases(names) for names in matched]
+            timings["match"] = time.perf_counter() - start
+
+        if mode in ("dense", "hybrid") and query_embeddings is None and not sources:
+            start = time.perf_counter()
+            query_embeddings = self.query_encoder.encode_many(queries)
+            timings["encode"] = time.perf_counter() - start
+
+        results = self._search(queries, query_embeddings, diseases, mode, keep, fetch, timings, sources)
+
+        # Search without the filter where it found nothing (use the global results instead), and
+        # where the question names several diseases, since any of them may be only a side mention
+        # ("Baker's cyst ... arthritis"): blend the global ranking into the filtered one
+        retry = [
+            i for i, result in enumerate(results)
+            if diseases[i] and (not result["ids"] or len(matched[i]) > 1)
+        ]
+        if retry:
+            fallback = self._search(
+                [queries[i] for i in retry],
+                [query_embeddings[i] for i in retry] if query_embeddings is not None else None,
+                [[] for _ in retry], mode, keep, fetch, {}, sources,
+            )
+            for i, result in zip(retry, fallback):
+                results[i] = self._blend(results[i], result, keep) if results[i]["ids"] else result
+
+        # Over-fetched candidates -> cross-encoder -> best n_results
+        if rerank:
+            for query, result in zip(queries, results):
+                start = time.perf_counter()
+                result["ids"], result["contents"], result["scores"] = self.reranker.rerank(
+                    query, result["ids"], result["contents"], n_results
+                )
+                result["timings"]["rerank"] = time.perf_counter() - start
+
+        for result in results:
+            result["timings"] = dict(timings, **result["timings"])
+        return results
+
+    def _search(self, queries, query_embeddings, diseases, mode, keep, fetch, timings, sources=()):
+        dense_futures, sparse_future = {}, None
+        if mode in ("dense", "hybrid"):
+            wheres = [self.where_filter(names) for names in diseases]
+            if sources:
+                for name, source in sources:
+                    dense_futures[name] = self._pool.submit(self._dense_source, source, queries, query_embeddings, wheres, fetch)
+            else:
+                dense_futures[None] = self._pool.submit(self._dense, query_embeddings, wheres, fetch)
+        if mode in ("sparse", "hybrid"):
+            allowed = [self._allowed_ids(names) for names in diseases]
+            sparse_future = self._pool.submit(self._sparse, queries, allowed, fetch)
+
+        stage_timings = {}
+        start = time.perf_counter()
+        dense, sparse = {}, [None] * len(queries)
+        for name, future in dense_futures.items():
+            dense[name], seconds = future.result()
+            if name is not None:
+                stage_timings[f"dense.{name}"] = seconds
+            stage_timings["dense"] = max(stage_timings.get("dense", 0.0), seconds)
+        if sparse_future:
+            sparse, stage_timings["sparse"] = sparse_future.result()
+        stage_timings["retrieve"] = time.perf_counter() - start
+        timings.update(stage_timings)
+
+        source_weights = {name: source.weight for name, source in sources}
+        results = []
+        for index, (sparse_ranking, names) in enumerate(zip(sparse, diseases)):
+            documents, rankings, weights = {}, [], []
+            for name, dense_rankings in dense.items():
+                documents.update(dense_rankings[index])
+                rankings.append([chunk_id for chunk_id, _ in dense_rankings[index]])
+                weights.append(self.dense_weight * source_weights.get(name, 1.0))
+            if sparse_ranking is not None:
+                rankings.append(sparse_ranking)
+                weights.append(self.sparse_weight)
+            fused = reciprocal_rank_fusion(rankings, weights, self.rrf_k, limit=keep)
+
+            ids, contents, scores = [], [], []
+            for chunk_id, score in fused:
+                content = documents.get(chunk_id) or self.chunk_store.get_content(chunk_id)
+                if content:
+                    ids.append(chunk_id)
+                    contents.append(content)
+                    scores.append(score)
+            results.append({
+                "ids": ids,
+                "contents": contents,
+                "scores": scores,
+                "diseases": names,
+                "timings": dict(stage_timings),
+            })
+        return results
+
+    def _blend(self, filtered, unfiltered, keep):
+        """RRF of a filtered and an unfiltered result for the same query; keeps the filter's diseases."""
+        contents = dict(zip(unfiltered["ids"], unfiltered["contents"]))
+        contents.update(zip(filtered["ids"], filtered["contents"]))
+        fused = reciprocal_rank_fusion([filtered["ids"], unfiltered["ids"]], k=self.rrf_k, limit=keep)
+        return dict(
+            filtered,
+            ids=[chunk_id for chunk_id, _ in fused],
+            contents=[contents[chunk_id] for chunk_id, _ in fused],
+            scores=[score for _, score in fused],
+        )
+
+    def _allowed_ids(self, diseases):
+        if not diseases:
+            return None
+        allowed = set()
+        for disease in diseases:
+            allowed |= self._disease_ids.get(disease, set())
+        return allowed
+
+    def retrieve(self, query, n_results=5, query_embedding=None, mode=None, disease_filter=None, rerank=None,
+                 collections=None):
+        embeddings = [query_embedding] if query_embedding is not None else None
+        return self.retrieve_many([query], n_results, embeddings, mode, disease_filter, rerank, collections)[0]
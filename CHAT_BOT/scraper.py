@@ -2,19 +2,48 @@ import json
 from selenium.common.exceptions import WebDriverException, NoSuchElementException, TimeoutException
 from selenium import webdriver
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+import argparse
 import string
-import time
 import os
 
 class SeleniumScraper:
-    def __init__(self, url):
+    def __init__(self, url, headless=False, wait_timeout=15):
         """Initialize the WebDriver and open the given URL."""
-        self.scraper = webdriver.Chrome()
+        options = webdriver.ChromeOptions()
+        if headless:
+            options.add_argument("--headless=new")
+        self.scraper = webdriver.Chrome(options=options)
         self.url = url
+        self.wait_timeout = wait_timeout
         self.failed_urls = []
         self.scraped_data = {}
         os.makedirs("scraped_data", exist_ok=True)
 
+    def wait_until_ready(self, content_id="main-content"):
+        """Wait for the document to finish loading and the main content to be present (no fixed sleeps)."""
+        wait = WebDriverWait(self.scraper, self.wait_timeout)
+        wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+        try:
+            wait.until(EC.presence_of_element_located((By.ID, content_id)))
+        except TimeoutException:
+            pass  # Index pages have no main-content block
+
+    def open_in_new_tab(self, url):
+        """Open url in a new tab, switch to it and wait until it is ready."""
+        handles = len(self.scraper.window_handles)
+        self.scraper.execute_script("window.open(arguments[0], '_blank');", url)
+        WebDriverWait(self.scraper, self.wait_timeout).until(EC.number_of_windows_to_be(handles + 1))
+        self.scraper.switch_to.window(self.scraper.window_handles[-1])
+        self.wait_until_ready()
+
+    def fetch_rendered(self, url):
+        """Rendered HTML of url (fallback for pages the HTTP scraper cannot read from static HTML)."""
+        self.scraper.get(url)
+        self.wait_until_ready()
+        return self.scraper.page_source
+
     def get_disease_data(self, elements):
         data = {}
         key, value = "", ""
@@ -42,6 +71,7 @@ class SeleniumScraper:
         scraper = self.scraper
         try:
             scraper.get(self.url)
+            self.wait_until_ready()
         except (WebDriverException, TimeoutException) as e:
             print(f"Failed to load {self.url}: {e}")
             return
@@ -59,13 +89,16 @@ class SeleniumScraper:
                 if it == 26:
                     break
         
-        for i in alphabet_tags:
-            print(f"Processing Alphabet: {i.text}")
+        # Keep the letter URLs: element references go stale once we navigate away
+        alphabet_links = [(i.text, i.get_attribute("href")) for i in alphabet_tags]
+        for letter, letter_url in alphabet_links:
+            print(f"Processing Alphabet: {letter}")
             try:
-                i.click()
-                time.sleep(4)
-            except WebDriverException as e:
-                print(f"Error clicking alphabet {i.text}: {e}")
+                scraper.switch_to.window(scraper.window_handles[0])
+                scraper.get(letter_url)
+                self.wait_until_ready()
+            except (WebDriverException, TimeoutException) as e:
+                print(f"Error opening alphabet {letter}: {e}")
                 continue
             
             a_tags = scraper.find_elements(By.TAG_NAME, "a")
@@ -79,9 +112,7 @@ class SeleniumScraper:
                 print(f"Opening disease page: {disease_name}")
                 
                 try:
-                    scraper.execute_script("window.open(arguments[0], '_blank');", url)
-                    time.sleep(2)
-                    scraper.switch_to.window(scraper.window_handles[-1])
+                    self.open_in_new_tab(url)
                     
                     # Try to get overview data from multiple XPaths
                     overview_data = {}
@@ -107,9 +138,7 @@ class SeleniumScraper:
                     
                     if diagnosis_tag:
                         try:
-                            scraper.execute_script("window.open(arguments[0], '_blank');", diagnosis_tag.get_attribute("href"))
-                            time.sleep(5)
-                            scraper.switch_to.window(scraper.window_handles[-1])
+                            self.open_in_new_tab(diagnosis_tag.get_attribute("href"))
                             for xpath in ['//*[@id="main-content"]/div[1]/div[1]/div[2]', '//*[@id="main-content"]/div[1]/div[1]/div[3]']:
                                 try:
                                     diagnosis_main_content = scraper.find_element(By.XPATH, xpath)
@@ -143,13 +172,12 @@ class SeleniumScraper:
                             print("Base window is closed unexpectedly.")
                     else:
                         print("No other windows open. Skipping window switch.")
-            
-            scraper.back()
-            break
 
-    def close_chrome(self):
-        time.sleep(5)
+    def quit(self):
         self.scraper.quit()
+
+    def close_chrome(self):
+        self.quit()
         
         if self.failed_urls:
             with open("failed_urls.txt", "w") as f:
@@ -159,8 +187,33 @@ class SeleniumScraper:
         with open("full_scraped_data.json", "w") as f:
             json.dump(self.scraped_data, f, indent=4)
 
+def main():
+    parser = argparse.ArgumentParser(description="Scrape Mayo Clinic disease pages.")
+    parser.add_argument("--url", default="https://www.mayoclinic.org/")
+    parser.add_argument("--mode", choices=["http", "selenium"], default="http",
+                        help="http: parallel fetch + HTML parsing (Selenium only as fallback); selenium: one browser window")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests-per-minute", type=int, default=60, help="Per host")
+    parser.add_argument("--state-file", default="crawl_state.json")
+    parser.add_argument("--letters", nargs="+", default=None, help="Only these index letters")
+    parser.add_argument("--no-fallback", action="store_true", help="Never start Chrome in http mode")
+    args = parser.parse_args()
+
+    if args.mode == "selenium":
+        scraper = SeleniumScraper(args.url)
+        scraper.scrap_it()
+        scraper.close_chrome()
+        return
+
+    from http_scraper import HTTPScraper
+    fallback = None if args.no_fallback else (lambda: SeleniumScraper(args.url, headless=True))
+    scraper = HTTPScraper(args.url, "scraped_data", args.state_file, args.workers, args.requests_per_minute,
+                          fallback=fallback, letters=args.letters)
+    try:
+        counts = scraper.crawl()
+        print(f"Crawl finished: {counts}")
+    finally:
+        scraper.close()
+
 if __name__ == "__main__":
-    url = "https://www.mayoclinic.org/"
-    scraper = SeleniumScraper(url)
-    scraper.scrap_it()
-    scraper.close_chrome()
+    main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import time
+import zipfile
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CHAT_BOT"))
+from metrics import percentile  # Same percentiles as the app's rolling stage metrics
+
+# Golden set shipped with the repo: generated_testset/<disease>_Q<n>.json
+golden_set_zip = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Golden_set.zip")
+
+
+def _read_golden_files(path):
+    """Yield (name, bytes) for every .json file in a folder or zip, closing each file after reading."""
+    if os.path.isdir(path):
+        for name in sorted(f for f in os.listdir(path) if f.endswith(".json")):
+            with open(os.path.join(path, name), "rb") as file:
+                yield name, file.read()
+        return
+    with zipfile.ZipFile(path) as archive:
+        for name in sorted(n for n in archive.namelist() if n.endswith(".json")):
+            yield name, archive.read(name)
+
+
+def load_golden_set(path=golden_set_zip, limit=None):
+    """Read the golden questions straight from the zip (or a folder). Returns [{question, answer, disease, file}]."""
+    items = []
+    with closing(_read_golden_files(path)) as files:  # Also closes the zip when `limit` stops early
+        for name, raw in files:
+            try:
+                data = json.loads(raw.decode("utf-8"))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if data.get("question") and data.get("disease"):
+                items.append({
+                    "question": data["question"],
+                    "answer": data.get("answer", ""),
+                    "disease": data["disease"],
+                    "file": os.path.basename(name),
+                })
+            if limit and len(items) >= limit:
+                break
+    return items
+
+
+def latency_summary(seconds):
+    """p50/p95/p99/mean/max in milliseconds."""
+    return {
+        "count": len(seconds),
+        "mean_ms": 1000 * sum(seconds) / len(seconds) if seconds else 0.0,
+        "p50_ms": 1000 * percentile(seconds, 50),
+        "p95_ms": 1000 * percentile(seconds, 95),
+        "p99_ms": 1000 * percentile(seconds, 99),
+        "max_ms": 1000 * max(seconds) if seconds else 0.0,
+    }
+
+
+def measure_throughput(call, items, concurrency):
+    """Run call(item) for every item on `concurrency` threads; returns (queries/sec, per-call latencies)."""
+    def timed(item):
+        start = time.perf_counter()
+        call(item)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, items))
+    elapsed = time.perf_counter() - start
+    return len(items) / elapsed if elapsed else 0.0, latencies
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
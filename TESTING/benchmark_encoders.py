@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CHAT_BOT"))
+from onnx_encoder import ENCODER_BACKENDS, onnx_dir, cosine_parity, parity_tolerance
+from bench_utils import load_golden_set, latency_summary, golden_set_zip
+from benchmark_retrieval import minilm_models
+
+report_path = "encoder_benchmark.json"
+
+
+def _rss_bytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux reports KiB
+
+
+def _run_encoder(model_name, backend, base_dir, questions, threads, batch_size):
+    """Runs in a fresh process so import/startup time and peak RSS belong to this backend alone."""
+    baseline = _rss_bytes()
+    start = time.perf_counter()
+    from onnx_encoder import load_encoder
+    encoder = load_encoder(model_name, backend, base_dir, threads)
+    load_seconds = time.perf_counter() - start
+    encoder.encode([questions[0]], show_progress_bar=False)
+    first_encode_seconds = time.perf_counter() - start - load_seconds
+
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        encoder.encode([question], show_progress_bar=False)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    embeddings = encoder.encode(questions, batch_size=batch_size, show_progress_bar=False)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "startup_seconds": load_seconds,
+        "first_encode_seconds": first_encode_seconds,
+        "latencies": latencies,
+        "batch_qps": len(questions) / batch_seconds if batch_seconds else 0.0,
+        "peak_rss_delta_bytes": _rss_bytes() - baseline,
+        "embeddings": [[float(x) for x in row] for row in embeddings],
+    }
+
+
+def run_isolated(*args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_run_encoder, *args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyTorch vs ONNX Runtime query encoders: startup, latency, parity.")
+    parser.add_argument("--golden-set", default=golden_set_zip)
+    parser.add_argument("--models", nargs="+", default=minilm_models)
+    parser.add_argument("--backends", nargs="+", choices=ENCODER_BACKENDS, default=list(ENCODER_BACKENDS))
+    parser.add_argument("--onnx-dir", default=onnx_dir, help="Where onnx_encoder.py exported the models")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--tolerance", type=float, default=parity_tolerance)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--output", default=report_path)
+    args = parser.parse_args()
+
+    questions = [item["question"] for item in load_golden_set(args.golden_set, args.limit)]
+    print(f"Loaded {len(questions)} golden questions")
+    report = {"created": datetime.datetime.now().isoformat(timespec="seconds"), "questions": len(questions),
+              "tolerance": args.tolerance, "models": []}
+    failed = []
+
+    for model_name in args.models:
+        entry = {"model": model_name, "backends": []}
+        reference = None
+        # torch first: it is the parity reference for the exported backends
+        for backend in sorted(args.backends, key=lambda name: name != "torch"):
+            run = run_isolated(model_name, backend, args.onnx_dir, questions, args.threads, args.batch_size)
+            result = {
+                "name": backend,
+                "startup_seconds": run["startup_seconds"],
+                "first_encode_seconds": run["first_encode_seconds"],
+                "peak_rss_delta_bytes": run["peak_rss_delta_bytes"],
+                "latency": latency_summary(run["latencies"]),
+                "batch_qps": run["batch_qps"],
+            }
+            if backend == "torch":
+                reference = run["embeddings"]
+            elif reference is not None:
+                minimum, mean = cosine_parity(reference, run["embeddings"])
+                result.update(min_cosine=minimum, mean_cosine=mean, parity_ok=minimum >= args.tolerance)
+                if minimum < args.tolerance:
+                    failed.append(f"{model_name} {backend}")
+            entry["backends"].append(result)
+
+        print(model_name)
+        for result in entry["backends"]:
+            parity = f"  min cos {result['min_cosine']:.4f}" if "min_cosine" in result else ""
+            print(
+                f"  {result['name']:<10} startup {result['startup_seconds'] * 1000:.0f}ms  "
+                f"p50 {result['latency']['p50_ms']:.2f}ms  p99 {result['latency']['p99_ms']:.2f}ms  "
+                f"batch {result['batch_qps']:.0f} q/s  rss +{result['peak_rss_delta_bytes'] / 1e6:.0f}MB{parity}"
+            )
+        report["models"].append(entry)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report saved to {args.output}")
+    if failed:
+        sys.exit(f"Cosine parity below {args.tolerance}: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
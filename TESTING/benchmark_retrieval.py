@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import itertools
+import tracemalloc
+
+# Retrieval only: no Gemini calls, and models must already be in the local Hugging Face cache
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CHAT_BOT"))
+from chunk_store import ChunkStore
+from embedding_cache import QueryEmbeddingCache
+from retrieval import Retriever, CollectionSource
+from bench_utils import load_golden_set, latency_summary, measure_throughput, directory_size, golden_set_zip
+
+# Paths
+chroma_path = "/home/shtlp_0042/Desktop/RAG/chroma_db"
+chunks_folder = "/home/shtlp_0042/Desktop/RAG/processed_data"
+report_path = "retrieval_benchmark.json"
+
+# Collections built by embedding_generator.py
+minilm_models = [
+    "sentence-transformers/all-MiniLM-L6-v2",
+    "sentence-transformers/all-MiniLM-L12-v2",
+    "sentence-transformers/all-MiniLM-L6-v1",
+]
+
+# Retrieval configurations to compare (BM25-only runs once, it does not use a collection)
+retrieval_configs = [
+    {"name": "dense", "mode": "dense", "disease_filter": False},
+    {"name": "dense+filter", "mode": "dense", "disease_filter": True},
+    {"name": "sparse", "mode": "sparse", "disease_filter": False},
+    {"name": "hybrid", "mode": "hybrid", "disease_filter": False},
+    {"name": "hybrid+filter", "mode": "hybrid", "disease_filter": True},
+]
+
+# Ensemble runs: every subset of two or more --models, queried in parallel and fused with RRF
+ensemble_configs = [
+    {"name": "ensemble-dense", "mode": "dense", "disease_filter": False},
+    {"name": "ensemble-hybrid+filter", "mode": "hybrid", "disease_filter": True},
+]
+
+# Phrasings the disease matcher must resolve (question -> diseases it has to name)
+matcher_probes = {
+    "What are the symptoms of Alzheimer's disease?": ["alzheimers disease"],
+    "Is Parkinson's disease hereditary?": ["parkinsons disease"],
+    "what causes baker's cyst": ["bakers cyst"],
+    "Can a Baker's cyst be caused by arthritis?": ["bakers cyst", "arthritis"],
+    "How does GERD lead to Barrett's esophagus?": ["gerd", "barretts esophagus"],
+}
+
+
+def matcher_checks(matcher, items):
+    """Golden-set disease matching (right / wrong / no disease named) plus the fixed phrasing probes."""
+    counts = {"right": 0, "wrong": 0, "none": 0}
+    for item in items:
+        found = matcher.expand(matcher.match(item["question"]))
+        counts["none" if not found else "right" if item["disease"] in found else "wrong"] += 1
+    failed = {}
+    for question, expected in matcher_probes.items():
+        found = matcher.match(question)
+        if not set(expected) <= set(found):
+            failed[question] = found
+    return {"golden_set": counts, "probes": len(matcher_probes), "failed_probes": failed}
+
+
+def disease_metrics(results, items, chunk_store, ks):
+    """Disease-level recall@k and MRR: a hit is a retrieved chunk from the question's disease."""
+    recall = {k: 0 for k in ks}
+    reciprocal_ranks = 0.0
+    for result, item in zip(results, items):
+        diseases = [(chunk_store.get_metadata(chunk_id) or {}).get("disease") for chunk_id in result["ids"]]
+        for k in ks:
+            recall[k] += item["disease"] in diseases[:k]
+        if item["disease"] in diseases:
+            reciprocal_ranks += 1.0 / (diseases.index(item["disease"]) + 1)
+    n = max(1, len(items))
+    metrics = {f"recall@{k}": recall[k] / n for k in ks}
+    metrics["mrr"] = reciprocal_ranks / n
+    return metrics
+
+
+def run_config(retriever, config, items, ks, concurrency_levels, load_queries):
+    questions = [item["question"] for item in items]
+    n_results = max(ks)
+    kwargs = {"mode": config["mode"], "disease_filter": config["disease_filter"], "rerank": config.get("rerank", False)}
+    if "collections" in config:
+        kwargs["collections"] = config["collections"]
+
+    # Sequential pass: quality metrics and per-query latency (encoding included, query cache disabled)
+    results, latencies, stage_totals = [], [], {}
+    for question in questions:
+        start = time.perf_counter()
+        result = retriever.retrieve(question, n_results, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        results.append(result)
+        for stage, seconds in result["timings"].items():
+            stage_totals.setdefault(stage, []).append(seconds)
+
+    report = {
+        "config": config,
+        "quality": disease_metrics(results, items, retriever.chunk_store, ks),
+        "latency": latency_summary(latencies),
+        "stages": {stage: latency_summary(values) for stage, values in stage_totals.items()},
+        "load": [],
+    }
+
+    # Concurrent load: queries/sec at each concurrency level
+    sample = questions[:load_queries]
+    for concurrency in concurrency_levels:
+        qps, load_latencies = measure_throughput(lambda q: retriever.retrieve(q, n_results, **kwargs), sample, concurrency)
+        report["load"].append({"concurrency": concurrency, "qps": qps, "latency": latency_summary(load_latencies)})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark over the golden set (no Gemini).")
+    parser.add_argument("--golden-set", default=golden_set_zip)
+    parser.add_argument("--chroma-path", default=chroma_path)
+    parser.add_argument("--chunks-folder", default=chunks_folder)
+    parser.add_argument("--models", nargs="+", default=minilm_models)
+    parser.add_argument("--configs", nargs="+", default=[config["name"] for config in retrieval_configs])
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 3, 5])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--load-queries", type=int, default=200, help="Questions replayed per concurrency level")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N golden questions")
+    parser.add_argument("--rerank", action="store_true", help="Also run hybrid+filter with cross-encoder re-ranking")
+    parser.add_argument("--no-ensemble", action="store_true", help="Skip the multi-collection ensemble runs")
+    parser.add_argument("--output", default=report_path)
+    args = parser.parse_args()
+
+    import chromadb
+    from sentence_transformers import SentenceTransformer
+
+    items = load_golden_set(args.golden_set, args.limit)
+    print(f"Loaded {len(items)} golden questions")
+
+    chunk_store = ChunkStore(args.chunks_folder)
+    chroma_client = chromadb.PersistentClient(path=args.chroma_path)
+
+    configs = [config for config in retrieval_configs if config["name"] in args.configs]
+    reranker = None
+    if args.rerank:
+        from reranker import CrossEncoderReranker
+        reranker = CrossEncoderReranker()
+        configs.append({"name": "hybrid+filter+rerank", "mode": "hybrid", "disease_filter": True, "rerank": True})
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "questions": len(items),
+        "chunks": len(chunk_store),
+        "memory": {"chroma_dir_bytes": directory_size(args.chroma_path)},
+        "runs": [],
+    }
+
+    sparse_done = False
+    sources = {}
+    for model_name in args.models:
+        collection = chroma_client.get_collection(name=model_name.replace("/", "_"))
+        model = SentenceTransformer(model_name)
+        encoder = QueryEmbeddingCache(model, model_name, max_size=0)  # Measure real encoding every time
+        retriever = Retriever(collection, chunk_store, encoder, reranker=reranker)
+        sources[collection.name] = CollectionSource(collection, encoder)
+
+        tracemalloc.start()
+        retriever.refresh_indexes()
+        bm25_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        dimension = model.get_sentence_embedding_dimension()
+        report["memory"]["bm25_and_matcher_bytes"] = bm25_bytes
+        if "matcher" not in report:
+            report["matcher"] = matcher_checks(retriever.matcher, items)
+            print(f"Disease matcher: {report['matcher']['golden_set']}, failed probes: {report['matcher']['failed_probes']}")
+        report["memory"][collection.name] = {
+            "vectors": collection.count(),
+            "dimension": dimension,
+            "float32_vector_bytes": collection.count() * dimension * 4,
+        }
+
+        for config in configs:
+            if config["mode"] == "sparse":
+                if sparse_done:
+                    continue
+                sparse_done = True
+            label = "bm25" if config["mode"] == "sparse" else model_name
+            print(f"Running {config['name']} on {label}")
+            run = run_config(retriever, config, items, args.k, args.concurrency, args.load_queries)
+            run["collection"] = label
+            report["runs"].append(run)
+            print(
+                f"  recall@{max(args.k)} {run['quality'][f'recall@{max(args.k)}']:.3f}  mrr {run['quality']['mrr']:.3f}  "
+                f"p50 {run['latency']['p50_ms']:.1f}ms  p95 {run['latency']['p95_ms']:.1f}ms  p99 {run['latency']['p99_ms']:.1f}ms"
+            )
+
+    # Parallel multi-collection ensembles (dense latency should track the slowest collection, not the sum)
+    names = list(sources)
+    subsets = [list(combination) for size in range(2, len(names) + 1) for combination in itertools.combinations(names, size)]
+    if subsets and not args.no_ensemble:
+        first = sources[names[0]]
+        retriever = Retriever(first.collection, chunk_store, first.query_encoder, sources=sources)
+        for subset, config in itertools.product(subsets, ensemble_configs):
+            config = dict(config, collections=subset)
+            label = "+".join(subset)
+            print(f"Running {config['name']} on {label}")
+            run = run_config(retriever, config, items, args.k, args.concurrency, args.load_queries)
+            run["collection"] = label
+            report["runs"].append(run)
+            print(
+                f"  recall@{max(args.k)} {run['quality'][f'recall@{max(args.k)}']:.3f}  mrr {run['quality']['mrr']:.3f}  "
+                f"p50 {run['latency']['p50_ms']:.1f}ms  p95 {run['latency']['p95_ms']:.1f}ms  p99 {run['latency']['p99_ms']:.1f}ms"
+            )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
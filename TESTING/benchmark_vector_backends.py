@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CHAT_BOT"))
+from quantized_index import QuantizedVectorIndex, read_collection, write_index, normalize
+from bench_utils import load_golden_set, latency_summary, directory_size, golden_set_zip
+from benchmark_retrieval import chroma_path, minilm_models
+
+work_dir = "/home/shtlp_0042/Desktop/RAG/quantized_bench"
+report_path = "vector_backend_benchmark.json"
+
+# Quantized variants compared against Chroma (IVF lists ~ sqrt(N) unless given)
+variants = [
+    {"name": "int8", "quantization": "int8", "ivf": False, "rescore": False},
+    {"name": "int8+rescore", "quantization": "int8", "ivf": False, "rescore": True},
+    {"name": "int8-ivf+rescore", "quantization": "int8", "ivf": True, "rescore": True},
+    {"name": "binary", "quantization": "binary", "ivf": False, "rescore": False},
+    {"name": "binary+rescore", "quantization": "binary", "ivf": False, "rescore": True},
+    {"name": "binary-ivf+rescore", "quantization": "binary", "ivf": True, "rescore": True},
+]
+
+
+def _rss_bytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux reports KiB
+
+
+def _run_backend(backend, location, name, queries, k, options):
+    """Runs in a fresh process so load time and peak RSS belong to this backend alone."""
+    baseline = _rss_bytes()
+    start = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+        index = chromadb.PersistentClient(path=location).get_collection(name=name)
+    else:
+        index = QuantizedVectorIndex(location, **options)
+    index.query(query_embeddings=[queries[0]], n_results=k)  # First query pages in / warms the index
+    load_seconds = time.perf_counter() - start
+
+    latencies, ids = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = index.query(query_embeddings=[query], n_results=k)
+        latencies.append(time.perf_counter() - start)
+        ids.append(result["ids"][0])
+
+    start = time.perf_counter()
+    index.query(query_embeddings=queries, n_results=k)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "load_seconds": load_seconds,
+        "latencies": latencies,
+        "batch_qps": len(queries) / batch_seconds if batch_seconds else 0.0,
+        "peak_rss_delta_bytes": _rss_bytes() - baseline,
+        "ids": ids,
+    }
+
+
+def run_isolated(*args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_run_backend, *args).result()
+
+
+def recall_at_k(found, expected):
+    return sum(len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(found, expected)) / max(1, len(expected))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma vs quantized mmap index: memory, load time, latency, recall.")
+    parser.add_argument("--golden-set", default=golden_set_zip)
+    parser.add_argument("--chroma-path", default=chroma_path)
+    parser.add_argument("--models", nargs="+", default=minilm_models)
+    parser.add_argument("--work-dir", default=work_dir, help="Where the quantized variants are written")
+    parser.add_argument("--variants", nargs="+", default=[variant["name"] for variant in variants])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ivf-lists", type=int, default=0, help="0 = sqrt(number of vectors)")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--rescore-candidates", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--output", default=report_path)
+    args = parser.parse_args()
+
+    import chromadb
+    from sentence_transformers import SentenceTransformer
+
+    questions = [item["question"] for item in load_golden_set(args.golden_set, args.limit)]
+    print(f"Loaded {len(questions)} golden questions")
+    chroma_client = chromadb.PersistentClient(path=args.chroma_path)
+    report = {"created": datetime.datetime.now().isoformat(timespec="seconds"), "questions": len(questions),
+              "k": args.k, "collections": []}
+
+    for model_name in args.models:
+        name = model_name.replace("/", "_")
+        queries = SentenceTransformer(model_name).encode(questions, batch_size=64, show_progress_bar=False).tolist()
+        ids, vectors, diseases = read_collection(chroma_client.get_collection(name=name))
+
+        # Exact float32 cosine top-k is the ground truth for every backend (HNSW is approximate too)
+        vectors = normalize(vectors)
+        exact = [[ids[row] for row in np.argsort(-(vectors @ query))[: args.k]] for query in normalize(queries)]
+        entry = {"collection": name, "vectors": len(ids), "dimension": int(vectors.shape[1]), "backends": []}
+
+        chroma = run_isolated("chroma", args.chroma_path, name, queries, args.k, {})
+        entry["backends"].append({
+            "name": "chroma-hnsw-float32",
+            "disk_bytes": directory_size(args.chroma_path),
+            "load_seconds": chroma["load_seconds"],
+            "peak_rss_delta_bytes": chroma["peak_rss_delta_bytes"],
+            "latency": latency_summary(chroma["latencies"]),
+            "batch_qps": chroma["batch_qps"],
+            "recall_vs_exact": recall_at_k(chroma["ids"], exact),
+        })
+
+        ivf_lists = args.ivf_lists or int(np.sqrt(len(ids)))
+        for variant in (v for v in variants if v["name"] in args.variants):
+            location = os.path.join(args.work_dir, name, variant["name"])
+            start = time.perf_counter()
+            write_index(location, ids, vectors, diseases, variant["quantization"],
+                        ivf_lists if variant["ivf"] else 0, keep_float=variant["rescore"], name=name)
+            build_seconds = time.perf_counter() - start
+            options = {"rescore": variant["rescore"], "rescore_candidates": args.rescore_candidates, "nprobe": args.nprobe}
+            run = run_isolated("quantized", location, name, queries, args.k, options)
+            quantized_bytes = sum(os.path.getsize(os.path.join(location, f)) for f in os.listdir(location) if f != "vectors.npy")
+            entry["backends"].append({
+                "name": variant["name"],
+                "build_seconds": build_seconds,
+                "disk_bytes": directory_size(location),
+                "quantized_bytes": quantized_bytes,  # Everything but the float copy used for re-scoring
+                "load_seconds": run["load_seconds"],
+                "peak_rss_delta_bytes": run["peak_rss_delta_bytes"],
+                "latency": latency_summary(run["latencies"]),
+                "batch_qps": run["batch_qps"],
+                "recall_vs_exact": recall_at_k(run["ids"], exact),
+                "recall_vs_chroma": recall_at_k(run["ids"], chroma["ids"]),
+            })
+
+        print(f"{name} ({len(ids)} vectors)")
+        for backend in entry["backends"]:
+            print(
+                f"  {backend['name']:<22} recall@{args.k} {backend['recall_vs_exact']:.3f}  "
+                f"load {backend['load_seconds'] * 1000:.0f}ms  p50 {backend['latency']['p50_ms']:.2f}ms  "
+                f"p99 {backend['latency']['p99_ms']:.2f}ms  disk {backend['disk_bytes'] / 1e6:.1f}MB  "
+                f"rss +{backend['peak_rss_delta_bytes'] / 1e6:.1f}MB"
+            )
+        report["collections"].append(entry)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
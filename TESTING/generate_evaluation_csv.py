@@ -1,129 +1,181 @@
 import os
+import csv
 import json
 import time
-import google.generativeai as genai
-from tqdm import tqdm
-from evaluate import load
-from bert_score import score as bert_score
-from nltk.translate.meteor_score import meteor_score
-import torch
-import re
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from llm_judge import LLMJudge, MockBackend
+from llm_client import make_backend
 
-# Configure Gemini API
-genai.configure(api_key="YOUR_API_KEY")
+# Gemini API key (only used with --judge gemini)
+gemini_api_key = "YOUR_API_KEY"
 
 # Paths
 test_set_folder = "PATH_TO_TEST_SET"
 generated_folder = "PATH_TO_GENERATED_ANSWERS_BY_RAG"
 output_json_path = "OUTPUT_FILE_PATH"
-
-# Load metrics
-rouge_metric = load("rouge")
-bleu_metric = load("bleu")
-
-# Device setup
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
-# Store results
-results = []
-
-# List all files
-test_files = os.listdir(test_set_folder)
-
-# Process files with tqdm
-for filename in tqdm(test_files, desc="Processing Questions"):
-    test_file_path = os.path.join(test_set_folder, filename)
-    generated_file_path = os.path.join(generated_folder, filename)
-
-    if not os.path.exists(generated_file_path):
-        print(f"Skipping {filename}: No generated answer found.")
-        continue
-
-    # Load JSON files
-    with open(test_file_path, "r", encoding="utf-8") as f:
-        test_data = json.load(f)
-    with open(generated_file_path, "r", encoding="utf-8") as f:
-        generated_data = json.load(f)
-
-    # Extract data
-    question = test_data.get("question", "").strip()
-    disease = test_data.get("disease", "").strip()
-    reference_answer = test_data.get("answer", "").strip()
-    generated_answer = generated_data.get("answer", "").strip()
-
-    # Skip if response contains an API error
-    if "Error in generating response" in generated_answer or not generated_answer:
-        print(f"Skipping {filename}: API error in generated response.")
-        continue
-
-    # Compute BERTScore
-    P, R, F1 = bert_score([generated_answer], [reference_answer], lang="en", device=device)
-    bert_score_f1 = F1.mean().item()
-
-    # Compute ROUGE & BLEU
-    rouge_score = rouge_metric.compute(predictions=[generated_answer], references=[reference_answer])["rougeL"]
-    bleu_score = bleu_metric.compute(predictions=[generated_answer], references=[[reference_answer]])["bleu"]
-
-    # Compute METEOR
-    meteor = meteor_score([reference_answer.split()], generated_answer.split())
-
-    # Compute LLM faithfulness, relevance, coherence
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    prompt = f"""
-    Evaluate the following generated answer against the reference for faithfulness, relevance, and coherence.
-
-    Question: {question}
-
-    Reference Answer: {reference_answer}
-
-    Generated Answer: {generated_answer}
-
-    Score each from 0 (worst) to 1 (best).
-
-    Provide output in JSON format:
-    {{
-      "faithfulness": <score>,
-      "relevance": <score>,
-      "coherence": <score>
-    }}
-    """
-
-    try:
-        response = model.generate_content(prompt)
-        response_text = response.text
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]  # Remove leading ```json
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]  # Remove trailing ```
-        print(response_text)
-        eval_scores = json.loads(response_text)
-        
-        faithfulness = eval_scores.get("faithfulness", 0)
-        relevance = eval_scores.get("relevance", 0)
-        coherence = eval_scores.get("coherence", 0)
-
-    except Exception as e:
-        print(f"Error in LLM evaluation for {filename}: {e}")
-        faithfulness, relevance, coherence = 0, 0, 0
-
-    # Store result
-    results.append({
-        "question": question,
-        "disease": disease,
-        "reference_answer": reference_answer,
-        "generated_answer": generated_answer,
-        "meteor_score": meteor,
-        "faithfulness": faithfulness,
-        "relevance": relevance,
-        "coherence": coherence
-    })
-
-    # Append to JSON file (one by one to avoid memory issues)
-    with open(output_json_path, "a", encoding="utf-8") as f:
-        json.dump(results[-1], f, indent=4)
-        f.write(",\n")
-
-    # Sleep to avoid quota limit
-    time.sleep(3)
-
-print(f"\nProcessing complete! Results saved to {output_json_path}")
+output_csv_path = os.path.splitext(output_json_path)[0] + ".csv"
+judge_cache_path = "judge_cache.sqlite"  # Judge scores survive reruns and metric changes
+
+# Batch sizes / parallelism
+bert_batch_size = 64
+lexical_workers = os.cpu_count() or 1
+lexical_chunk_size = 64
+
+# Columns written to the CSV (and keys of every JSON record)
+result_fields = [
+    "question", "disease", "reference_answer", "generated_answer",
+    "bert_score_f1", "rouge_l", "bleu", "meteor_score",
+    "faithfulness", "relevance", "coherence",
+]
+
+_bleu_metric = None
+
+
+# Collect every (question, reference, generated) record that can be scored
+def load_pairs():
+    records = []
+    for filename in sorted(os.listdir(test_set_folder)):
+        test_file_path = os.path.join(test_set_folder, filename)
+        generated_file_path = os.path.join(generated_folder, filename)
+
+        if not os.path.exists(generated_file_path):
+            print(f"Skipping {filename}: No generated answer found.")
+            continue
+
+        # Load JSON files
+        with open(test_file_path, "r", encoding="utf-8") as f:
+            test_data = json.load(f)
+        with open(generated_file_path, "r", encoding="utf-8") as f:
+            generated_data = json.load(f)
+
+        generated_answer = generated_data.get("answer", "").strip()
+
+        # Skip if response contains an API error
+        if "Error in generating response" in generated_answer or not generated_answer:
+            print(f"Skipping {filename}: API error in generated response.")
+            continue
+
+        records.append({
+            "filename": filename,
+            "question": test_data.get("question", "").strip(),
+            "disease": test_data.get("disease", "").strip(),
+            "reference_answer": test_data.get("answer", "").strip(),
+            "generated_answer": generated_answer,
+        })
+    return records
+
+
+# Per-pair BLEU and METEOR for one slice of records (runs in a worker process)
+def _lexical_scores(pairs):
+    global _bleu_metric
+    from nltk.translate.meteor_score import meteor_score
+    if _bleu_metric is None:
+        from evaluate import load
+        _bleu_metric = load("bleu")
+
+    scores = []
+    for generated, reference in pairs:
+        try:
+            bleu = _bleu_metric.compute(predictions=[generated], references=[[reference]])["bleu"]
+        except ZeroDivisionError:
+            bleu = 0.0
+        meteor = meteor_score([reference.split()], generated.split())
+        scores.append((bleu, meteor))
+    return scores
+
+
+def compute_lexical_metrics(records):
+    """ROUGE-L for all pairs in one call; BLEU and METEOR spread over a process pool."""
+    from evaluate import load
+    predictions = [r["generated_answer"] for r in records]
+    references = [r["reference_answer"] for r in records]
+
+    rouge = load("rouge").compute(predictions=predictions, references=references, use_aggregator=False)["rougeL"]
+
+    pairs = list(zip(predictions, references))
+    slices = [pairs[i : i + lexical_chunk_size] for i in range(0, len(pairs), lexical_chunk_size)]
+    if lexical_workers > 1 and len(slices) > 1:
+        with ProcessPoolExecutor(max_workers=lexical_workers) as pool:
+            lexical = [score for part in pool.map(_lexical_scores, slices) for score in part]
+    else:
+        lexical = [score for part in map(_lexical_scores, slices) for score in part]
+
+    for record, rouge_l, (bleu, meteor) in zip(records, rouge, lexical):
+        record["rouge_l"] = rouge_l
+        record["bleu"] = bleu
+        record["meteor_score"] = meteor
+
+
+def compute_bert_scores(records):
+    """BERTScore for all pairs with the model loaded once and scored in large batches. Returns the device used."""
+    import torch
+    from bert_score import BERTScorer
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    scorer = BERTScorer(lang="en", device=device, batch_size=bert_batch_size)
+    _, _, f1 = scorer.score(
+        [r["generated_answer"] for r in records],
+        [r["reference_answer"] for r in records],
+        batch_size=bert_batch_size,
+    )
+    for record, value in zip(records, f1.tolist()):
+        record["bert_score_f1"] = value
+    return device
+
+
+def write_results(records):
+    results = [{field: record.get(field) for field in result_fields} for record in records]
+
+    # One valid JSON array
+    with open(output_json_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
+
+    with open(output_csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=result_fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score generated answers against the golden set.")
+    parser.add_argument("--judge", choices=["gemini", "mock"], default="gemini", help="LLM judge backend")
+    parser.add_argument("--judge-workers", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=int, default=15)
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="Seconds per mock judge call")
+    args = parser.parse_args()
+
+    records = load_pairs()
+    print(f"Scoring {len(records)} answers")
+    if not records:
+        write_results(records)
+        return
+
+    if args.judge == "mock":
+        judge = LLMJudge(MockBackend(args.mock_latency), judge_cache_path, requests_per_minute=1_000_000, max_workers=args.judge_workers)
+    else:
+        backend = make_backend("gemini", model_name="gemini-2.0-flash", api_key=gemini_api_key)
+        judge = LLMJudge(backend, judge_cache_path, args.requests_per_minute, max_workers=args.judge_workers)
+
+    # The judge stage runs in the background while the local metrics are computed.
+    # Each stage writes different keys on the records, so they can share them.
+    with ThreadPoolExecutor(max_workers=1) as stage:
+        judge_start = time.perf_counter()
+        judged = stage.submit(judge.score_records, records)
+
+        start = time.perf_counter()
+        compute_lexical_metrics(records)
+        print(f"ROUGE/BLEU/METEOR: {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        device = compute_bert_scores(records)
+        print(f"BERTScore: {time.perf_counter() - start:.1f}s on {device}")
+
+        judged.result()
+        print(f"LLM judge: {time.perf_counter() - judge_start:.1f}s, {judge.stats()}")
+
+    write_results(records)
+    print(f"\nProcessing complete! Results saved to {output_json_path} and {output_csv_path}")
+
+
+if __name__ == "__main__":
+    main()
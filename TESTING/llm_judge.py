@@ -0,0 +1,169 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CHAT_BOT"))
+from rate_limit import RateLimiter
+from llm_client import LLMClient
+
+# Bump whenever the prompt or the score parsing changes, so cached scores are not reused
+PROMPT_VERSION = "v1"
+
+SCORE_KEYS = ("faithfulness", "relevance", "coherence")
+
+JUDGE_PROMPT = """
+    Evaluate the following generated answer against the reference for faithfulness, relevance, and coherence.
+
+    Question: {question}
+
+    Reference Answer: {reference}
+
+    Generated Answer: {generated}
+
+    Score each from 0 (worst) to 1 (best).
+
+    Provide output in JSON format:
+    {{
+      "faithfulness": <score>,
+      "relevance": <score>,
+      "coherence": <score>
+    }}
+    """
+
+
+def build_prompt(question, reference, generated):
+    return JUDGE_PROMPT.format(question=question, reference=reference, generated=generated)
+
+
+def extract_scores(text):
+    """Pull the three scores out of a judge reply: fenced or bare JSON, or loose `"key": number` pairs."""
+    scores = {}
+    for candidate in re.findall(r"\{[^{}]*\}", text, re.DOTALL):
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict) and any(key in parsed for key in SCORE_KEYS):
+            scores = parsed
+            break
+    if not scores:
+        for key in SCORE_KEYS:
+            match = re.search(rf'"?{key}"?\s*[:=]\s*([0-9]*\.?[0-9]+)', text, re.IGNORECASE)
+            if match:
+                scores[key] = match.group(1)
+    if not scores:
+        raise ValueError(f"No scores found in judge reply: {text[:200]!r}")
+
+    result = {}
+    for key in SCORE_KEYS:
+        try:
+            result[key] = min(1.0, max(0.0, float(scores.get(key, 0))))
+        except (TypeError, ValueError):
+            result[key] = 0.0
+    return result
+
+
+class MockBackend:
+    """Offline judge backend for LLMClient: deterministic scores derived from the prompt hash, with optional latency."""
+
+    def __init__(self, latency=0.0):
+        self.name = "mock"
+        self.latency = latency
+
+    def generate(self, prompt, timeout=None):
+        if self.latency:
+            time.sleep(self.latency)
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        scores = {key: round(rng.uniform(0.5, 1.0), 2) for key in SCORE_KEYS}
+        return "```json\n" + json.dumps(scores) + "\n```"
+
+
+class JudgeCache:
+    """SQLite store of judge scores keyed by a hash of the judged inputs."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS judge_scores (key TEXT PRIMARY KEY, scores TEXT NOT NULL)")
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT scores FROM judge_scores WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, scores):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO judge_scores (key, scores) VALUES (?, ?)", (key, json.dumps(scores)))
+            self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class LLMJudge:
+    """Concurrent, rate-limited LLM-as-judge stage with an on-disk score cache.
+
+    backend: an llm_client backend (e.g. make_backend("gemini", ...)) or MockBackend. Calls go
+    through an LLMClient, so the judge gets the same timeouts, retries and quota limiting as the app.
+    """
+
+    def __init__(self, backend, cache_path=None, requests_per_minute=15, tokens_per_minute=1_000_000, max_workers=8,
+                 timeout=60.0):
+        self.client = LLMClient(backend, timeout=timeout, retries=5, base_delay=2.0, max_delay=60.0,
+                                rate_limiter=RateLimiter(requests_per_minute, tokens_per_minute),
+                                expected_output_tokens=64)
+        self.cache = JudgeCache(cache_path) if cache_path else None
+        self.max_workers = max_workers
+        self.cache_hits = 0
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def cache_key(self, question, reference, generated):
+        payload = json.dumps([self.client.backend.name, PROMPT_VERSION, question, reference, generated])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def score(self, question, reference, generated):
+        """Scores for one answer; failures score 0 and are not cached, so a rerun retries them."""
+        key = self.cache_key(question, reference, generated)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                with self._lock:
+                    self.cache_hits += 1
+                return cached
+
+        prompt = build_prompt(question, reference, generated)
+        try:
+            scores = extract_scores(self.client.generate(prompt))
+        except Exception as e:
+            print(f"Error in LLM evaluation: {e}")
+            with self._lock:
+                self.failures += 1
+            return {key: 0 for key in SCORE_KEYS}
+
+        with self._lock:
+            self.calls += 1
+        if self.cache:
+            self.cache.put(key, scores)
+        return scores
+
+    def score_records(self, records):
+        """Score every record concurrently and store the scores on the records."""
+        def run(record):
+            record.update(self.score(record["question"], record["reference_answer"], record["generated_answer"]))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(run, records))
+        return records
+
+    def stats(self):
+        return {"cache_hits": self.cache_hits, "calls": self.calls, "failures": self.failures, "client": self.client.stats()}
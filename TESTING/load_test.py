@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Offline: models must already be in the local Hugging Face cache, and the LLM is the stub backend
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CHAT_BOT"))
+from llm_client import LLMClient, StubBackend
+from metrics import MetricsRecorder
+from bench_utils import load_golden_set, latency_summary, golden_set_zip
+
+report_path = "load_test_report.json"
+
+# Spans recorded by RAGEngine.prepare(); whatever else prepare() takes is time spent waiting for a micro-batch
+prepare_stages = ("encode", "retrieve", "answer_cache", "context")
+
+# A closed-loop level counts as saturated once throughput grows by less than this over the previous level...
+min_throughput_gain = 0.10
+# ...or p95 latency exceeds this multiple of the lowest level's p95
+knee_latency_factor = 2.0
+
+
+class LoadRunner:
+    """Replays questions through RAGEngine.prepare() + generate(), the same calls the Streamlit app makes.
+
+    Each request records its end-to-end latency (from its scheduled arrival, so time spent queued
+    behind a saturated pool counts), first-token time and the engine's per-stage trace spans.
+    """
+
+    def __init__(self, engine, questions, stream=False, collections=None):
+        self.engine = engine
+        self.questions = questions
+        self.stream = stream
+        self.collections = collections
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def next_question(self):
+        with self._lock:
+            question = self.questions[self._next % len(self.questions)]
+            self._next += 1
+        return question
+
+    def request(self, question, scheduled=None):
+        start = time.perf_counter()
+        scheduled = start if scheduled is None else scheduled
+        trace = self.engine.metrics.start() if self.engine.metrics else None
+        sample = {"queue": start - scheduled, "error": None, "first_token": None, "cached": False}
+        try:
+            prepared = self.engine.prepare(question, trace, self.collections)
+            prepared_at = time.perf_counter()
+            on_text = (lambda text: None) if self.stream else None
+            _, first_token = self.engine.generate(prepared, on_text, trace)
+            sample["cached"] = bool(prepared["cached"])
+            sample["prepare"] = prepared_at - start
+            sample["first_token"] = prepared_at - scheduled + first_token
+        except Exception as e:
+            sample["error"] = f"{e.__class__.__name__}: {e}"
+        finished = time.perf_counter()
+        sample["latency"] = finished - scheduled
+        sample["spans"] = dict(trace.spans) if trace else {}
+        if trace:
+            self.engine.metrics.observe(trace)
+        if "prepare" in sample:
+            waited = sample["prepare"] - sum(sample["spans"].get(stage, 0.0) for stage in prepare_stages)
+            sample["spans"]["batch_wait"] = max(0.0, waited)
+        if sample["queue"] > 0:
+            sample["spans"]["queue"] = sample["queue"]
+        return sample
+
+    def closed_loop(self, concurrency, requests):
+        """`concurrency` simulated users, each sending its next question as soon as the last is answered."""
+        samples = []
+        remaining = [requests]
+
+        def user():
+            while True:
+                with self._lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                sample = self.request(self.next_question())
+                with self._lock:
+                    samples.append(sample)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=user) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - start
+
+    def open_loop(self, rate, duration, max_in_flight=256, seed=0):
+        """Poisson arrivals at `rate` requests/sec for `duration` seconds, independent of how fast answers come back."""
+        rng = random.Random(seed)
+        arrivals, at = [], 0.0
+        while True:
+            at += rng.expovariate(rate)
+            if at >= duration:
+                break
+            arrivals.append(at)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            futures = []
+            for offset in arrivals:
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self.request, self.next_question(), start + offset))
+            samples = [future.result() for future in futures]
+        return samples, time.perf_counter() - start
+
+
+def summarize(samples, wall_seconds):
+    """Throughput, latency percentiles and per-stage load for one level.
+
+    A stage's `busy` is its total seconds divided by wall time, i.e. the average number of
+    requests inside that stage at once (Little's law); `share` is its part of all request time.
+    """
+    ok = [sample for sample in samples if not sample["error"]]
+    errors = {}
+    for sample in samples:
+        if sample["error"]:
+            errors[sample["error"]] = errors.get(sample["error"], 0) + 1
+
+    stage_seconds = {}
+    for sample in ok:
+        for stage, seconds in sample["spans"].items():
+            stage_seconds.setdefault(stage, []).append(seconds)
+    request_seconds = sum(sample["latency"] for sample in ok) or 1e-9
+    stages = {
+        stage: dict(latency_summary(values), busy=sum(values) / wall_seconds, share=sum(values) / request_seconds)
+        for stage, values in sorted(stage_seconds.items())
+    }
+    first_tokens = [sample["first_token"] for sample in ok if sample["first_token"] is not None]
+    return {
+        "requests": len(samples),
+        "completed": len(ok),
+        "errors": errors,
+        "cached": sum(sample["cached"] for sample in ok),
+        "wall_seconds": wall_seconds,
+        "throughput_rps": len(ok) / wall_seconds if wall_seconds else 0.0,
+        "latency": latency_summary([sample["latency"] for sample in ok]),
+        "first_token": latency_summary(first_tokens),
+        "stages": stages,
+    }
+
+
+def mark_saturation(levels, open_loop=False):
+    """Flag saturated levels and name the stage whose mean latency grew the most since the first level.
+
+    Open-loop throughput follows the offered rate until requests queue up, so there only the
+    latency knee and errors count.
+    """
+    if not levels:
+        return None
+    baseline = levels[0]["summary"]
+    knee = None
+    for previous, level in zip([None] + levels[:-1], levels):
+        summary = level["summary"]
+        growth = {
+            stage: values["mean_ms"] - baseline["stages"].get(stage, {}).get("mean_ms", 0.0)
+            for stage, values in summary["stages"].items() if not stage.startswith(("retrieve.", "generate."))
+        }
+        level["bottleneck"] = max(growth, key=growth.get) if growth and max(growth.values()) > 0 else None
+        slow = summary["latency"]["p95_ms"] > knee_latency_factor * max(baseline["latency"]["p95_ms"], 1e-9)
+        flat = not open_loop and previous is not None and (
+            summary["throughput_rps"] < (1 + min_throughput_gain) * previous["summary"]["throughput_rps"]
+        )
+        level["saturated"] = bool(slow or flat or summary["errors"])
+        if level["saturated"] and knee is None and previous is not None:
+            knee = previous["load"]
+    return knee
+
+
+def print_level(label, level):
+    summary = level["summary"]
+    busiest = sorted(summary["stages"].items(), key=lambda item: -item[1]["busy"])[:3]
+    print(
+        f"  {label:<12} {summary['throughput_rps']:6.2f} req/s  p50 {summary['latency']['p50_ms']:7.0f}ms  "
+        f"p95 {summary['latency']['p95_ms']:7.0f}ms  p99 {summary['latency']['p99_ms']:7.0f}ms  "
+        f"errors {sum(summary['errors'].values())}  "
+        f"busy {', '.join('%s %.1f' % (stage, values['busy']) for stage, values in busiest)}"
+        + ("  SATURATED" if level.get("saturated") else "")
+    )
+
+
+def build_engine(args):
+    """The real query path (chunk store, MiniLM, Chroma, BM25) from rag_service.py, with the stub LLM."""
+    import rag_service
+
+    backend = StubBackend(args.llm_latency, args.llm_distribution, args.llm_spread, args.llm_error_rate, args.seed)
+    llm = LLMClient(backend, timeout=args.llm_timeout, retries=args.llm_retries, base_delay=0.05, max_delay=1.0)
+    engine = rag_service.build_engine(lambda: llm, use_answer_cache=args.answer_cache,
+                                      batch_window=args.batch_window, use_query_cache=args.query_cache)
+    engine.metrics = MetricsRecorder()  # Traces stay in memory instead of the service's metrics files
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the RAG query path with a stub LLM.")
+    parser.add_argument("--golden-set", default=golden_set_zip)
+    parser.add_argument("--limit", type=int, default=None, help="Only replay the first N golden questions")
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 2, 4, 8, 16, 32],
+                        help="Closed-loop sweep: simulated users per level (none to skip)")
+    parser.add_argument("--requests-per-level", type=int, default=200)
+    parser.add_argument("--rates", nargs="*", type=float, default=[],
+                        help="Open-loop sweep: Poisson arrival rates in requests/sec")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per open-loop rate")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Open-loop worker threads")
+    parser.add_argument("--warmup", type=int, default=5, help="Requests before measuring (loads models, pages in indexes)")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds per stub LLM call (median for lognormal)")
+    parser.add_argument("--llm-distribution", choices=["fixed", "uniform", "exponential", "lognormal"], default="lognormal")
+    parser.add_argument("--llm-spread", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of stub calls failing with a retryable 503")
+    parser.add_argument("--llm-timeout", type=float, default=30.0)
+    parser.add_argument("--llm-retries", type=int, default=2)
+    parser.add_argument("--stream", action="store_true", help="Stream answers like the Streamlit app does")
+    parser.add_argument("--collections", nargs="*", default=None, help="Ensemble collections (default: service default)")
+    parser.add_argument("--batch-window", type=float, default=0.005)
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on")
+    parser.add_argument("--query-cache", action="store_true", help="Keep the query embedding cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=report_path)
+    args = parser.parse_args()
+
+    items = load_golden_set(args.golden_set, args.limit)
+    questions = [item["question"] for item in items]
+    random.Random(args.seed).shuffle(questions)
+    print(f"Loaded {len(questions)} golden questions")
+
+    start = time.perf_counter()
+    engine = build_engine(args)
+    runner = LoadRunner(engine, questions, args.stream, args.collections)
+    for _ in range(args.warmup):
+        runner.request(runner.next_question())
+    print(f"Engine ready in {time.perf_counter() - start:.1f}s")
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "questions": len(questions),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "closed_loop": [],
+        "open_loop": [],
+    }
+
+    def run_level(kind, load, run):
+        batches_before, llm_before = engine.batch_stats, engine.llm.stats()
+        samples, wall_seconds = run()
+        batches_after, llm_after = engine.batch_stats, engine.llm.stats()
+        batches = batches_after["batches"] - batches_before["batches"]
+        level = {
+            "load": load,
+            "summary": summarize(samples, wall_seconds),
+            "mean_batch": (batches_after["items"] - batches_before["items"]) / batches if batches else 0.0,
+            "llm": {key: llm_after[key] - llm_before[key] for key in ("calls", "coalesced", "retried", "failures")},
+        }
+        report[kind].append(level)
+        return level
+
+    if args.concurrency:
+        print("Closed loop (users -> throughput / latency)")
+        for concurrency in args.concurrency:
+            level = run_level("closed_loop", concurrency,
+                              lambda: runner.closed_loop(concurrency, max(args.requests_per_level, concurrency)))
+            print_level(f"{concurrency} users", level)
+    if args.rates:
+        print("Open loop (arrival rate -> throughput / latency)")
+        for rate in args.rates:
+            level = run_level("open_loop", rate, lambda: runner.open_loop(rate, args.duration, args.max_in_flight, args.seed))
+            print_level(f"{rate:g} req/s", level)
+
+    report["closed_loop_knee"] = mark_saturation(report["closed_loop"])
+    report["open_loop_knee"] = mark_saturation(report["open_loop"], open_loop=True)
+    for kind, unit in (("closed_loop", "users"), ("open_loop", "req/s")):
+        if report[kind]:
+            knee = report[f"{kind}_knee"]
+            bottlenecks = [level["bottleneck"] for level in report[kind] if level["saturated"] and level["bottleneck"]]
+            print(f"{kind}: " + (f"saturates after {knee:g} {unit}, bottleneck {bottlenecks[0] if bottlenecks else 'unknown'}"
+                                 if knee is not None else "no saturation in the tested range"))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import json
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Small Mayo-like site for exercising the HTTP scraper offline:
+#   python scraper_fixture_server.py --port 8765
+#   python ../CHAT_BOT/scraper.py --url http://127.0.0.1:8765/ --no-fallback
+# Pages send ETag/Last-Modified and answer conditional requests with 304; /__stats reports the traffic.
+
+letters = [letter for letter in "ABCDEFGHIJKLMNOPRSTUVWXYZ"]  # No Q, like the real index
+last_modified = "Mon, 06 Jan 2025 10:00:00 GMT"
+
+
+def disease_names(letter, per_letter):
+    return [f"{letter.lower()}{'abcdefgh'[i]}disease" for i in range(per_letter)]
+
+
+def page(body):
+    return f"<!DOCTYPE html><html><head><title>Fixture</title></head><body>{body}</body></html>"
+
+
+def main_content(sections, extra=""):
+    """Same nesting the scraper reads: #main-content > div > div > div[2]."""
+    content = "".join(f"<h2>{heading}</h2>{html}" for heading, html in sections)
+    return f'<div id="main-content"><div><div><div class="nav">Menu</div><div>{content}</div></div></div></div>{extra}'
+
+
+def home_page():
+    return page("<nav>" + "".join(f'<a href="/diseases-conditions/index?letter={l}">{l}</a>' for l in letters) + "</nav>")
+
+
+def letter_page(letter, per_letter):
+    items = "".join(
+        f'<li><a href="/diseases-conditions/{name}/symptoms-causes/syc-{20350000 + i}">{name}</a></li>'
+        for i, name in enumerate(disease_names(letter, per_letter))
+    )
+    return page(f"<h1>Diseases starting with {letter}</h1><ul>{items}</ul>")
+
+
+def disease_page(name, number):
+    sections = [
+        ("Overview", f"<p>{name} is a fixture condition.</p><p>It is used by tests.</p>"),
+        ("Symptoms", f"<p>Signs of {name} include:</p><ul><li>Cough</li><li>Fever &amp; chills</li></ul>"),
+        ("Causes", "<p>Unknown.<br>Probably fixtures.</p>"),
+    ]
+    link = f'<a href="/diseases-conditions/{name}/diagnosis-treatment/drc-{number}">Diagnosis &amp; treatment</a>'
+    return page(main_content(sections, link))
+
+
+def diagnosis_page(name):
+    sections = [("Diagnosis", f"<p>{name} is diagnosed by reading the fixture.</p>"), ("Treatment", "<ul><li>Rest</li></ul>")]
+    return page(main_content(sections))
+
+
+class FixtureSite:
+    def __init__(self, per_letter=3, flaky_every=0):
+        self.per_letter = per_letter
+        self.flaky_every = flaky_every  # Every Nth disease page fails once with 503
+        self.requests = 0
+        self.not_modified = 0
+        self.by_kind = {}
+        self._failed_once = set()
+        self._lock = threading.Lock()
+
+    def render(self, path, query):
+        parts = [part for part in path.split("/") if part]
+        if not parts:
+            return "home", home_page()
+        if parts == ["diseases-conditions", "index"] and query.get("letter"):
+            return "letter", letter_page(query["letter"][0], self.per_letter)
+        if len(parts) == 4 and parts[0] == "diseases-conditions":
+            name, section, code = parts[1], parts[2], parts[3]
+            number = code.split("-")[-1]
+            if section == "symptoms-causes":
+                return "disease", disease_page(name, number)
+            if section == "diagnosis-treatment":
+                return "diagnosis", diagnosis_page(name)
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "not_modified": self.not_modified, "by_kind": dict(self.by_kind)}
+
+
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so the scraper's connection pool is exercised
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/__stats":
+                return self.send(200, json.dumps(site.stats()).encode(), {"Content-Type": "application/json"})
+
+            kind, html = site.render(url.path, parse_qs(url.query))
+            with site._lock:
+                site.requests += 1
+                site.by_kind[kind] = site.by_kind.get(kind, 0) + 1
+                flaky = (kind == "disease" and site.flaky_every and site.by_kind[kind] % site.flaky_every == 0
+                         and url.path not in site._failed_once)
+                if flaky:
+                    site._failed_once.add(url.path)
+            if html is None:
+                return self.send(404, b"Not found")
+            if flaky:
+                return self.send(503, b"Try again")
+
+            body = html.encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag or self.headers.get("If-Modified-Since") == last_modified:
+                with site._lock:
+                    site.not_modified += 1
+                return self.send(304, b"", {"ETag": etag, "Last-Modified": last_modified})
+            self.send(200, body, {"Content-Type": "text/html; charset=utf-8", "ETag": etag, "Last-Modified": last_modified})
+
+    return Handler
+
+
+def serve(port=0, per_letter=3, flaky_every=0):
+    """Start the fixture site on a background thread; returns (server, site, base URL)."""
+    site = FixtureSite(per_letter, flaky_every)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(site))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, site, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a small Mayo-like fixture site for the scraper.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--per-letter", type=int, default=3)
+    parser.add_argument("--flaky-every", type=int, default=0, help="Every Nth disease page returns 503 once")
+    args = parser.parse_args()
+    server, _, url = serve(args.port, args.per_letter, args.flaky_every)
+    print(f"Fixture site at {url} (stats at {url}__stats)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()